@@ -1,13 +1,24 @@
+import logging
 import os
 import json
+from pathlib import Path
 
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
 
+from config import config, invalidate_mcp_tools
 from data.definitions import AgentState, PROFESSION_OF_FAITH
+from data.indexes import BibleIndex
+from data.lazy import LazyBibleIndex
+from data.loaders import load_bible
+from data.references import parse_references, resolve_reference
 from sub_agents.generalist import generalist_agent
-from sub_agents.planner import planner_agent
+from plan_executor import PlanExecutor
+from sub_agents.planner import plan_route_stats, planner_agent
 
 
+logger = logging.getLogger(__name__)
+
 # 1. Global variable for the system prompt. You can edit this!
 SYSTEM_PROMPT = """你是一位聖經學習助手，專注於幫助使用者理解和學習聖經內容。請根據使用者的問題，本著聖經的信息來回到以聖經為出發點的答案。
 你的信仰宣言如下：
@@ -43,24 +54,96 @@ def check_env_vars() -> None:
         raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
 
+references_config = config.get("agent", {}).get("references", {})
+
+# The Bible version used to resolve references, loaded on first use
+_reference_index: BibleIndex | LazyBibleIndex | None = None
+
+def get_reference_index() -> BibleIndex | LazyBibleIndex:
+    global _reference_index
+    if _reference_index is None:
+        bible_version_path = Path(config["data"]["bible_versions"][0])
+        lazy_config = config["data"].get("lazy", {})
+        if lazy_config.get("enabled", False):
+            _reference_index = LazyBibleIndex(
+                bible_version_path, max_books=lazy_config.get("max_books", 8))
+        else:
+            _reference_index = BibleIndex(load_bible(
+                bible_version_path, **config["data"].get("loader", {})))
+    return _reference_index
+
+
+async def resolve_references(state: AgentState) -> dict:
+    """
+    Resolve the scripture references of the user request (e.g. "约3:16") to their text
+    locally, so that the agents get the verses without a get_bible_verses tool call.
+    """
+    if not references_config.get("enabled", True):
+        return {}
+    user_request = state["messages"][-1]["content"]
+    quotes = []
+    for reference in parse_references(user_request):
+        try:
+            quote = resolve_reference(
+                get_reference_index(), reference,
+                max_verses=references_config.get("max_verses", 60))
+            quotes.append(quote.model_dump())
+        except AssertionError as e:
+            logger.warning("Cannot resolve the reference %s: %s", reference.text, e)
+    return {"references": quotes}
+
+
 async def create_agent() -> StateGraph:
     check_env_vars()
 
     workflow = StateGraph(AgentState)
-    workflow.add_node("planner", planner_agent.invoke)
-    workflow.add_node("agent", generalist_agent.invoke)
-
-    workflow.add_edge(START, "planner")
+    workflow.add_node("references", resolve_references)
+    workflow.add_node("planner", planner_agent.ainvoke)
+    # Every task of the plan runs with the agent of its service, independent tasks concurrently
+    plan_executor = PlanExecutor(
+        services, max_concurrent_tasks=config.get("agent", {}).get("max_concurrent_tasks", 4))
+    workflow.add_node("agent", plan_executor.ainvoke)
+
+    workflow.add_edge(START, "references")
+    workflow.add_edge("references", "planner")
     workflow.add_edge("planner", "agent")
     workflow.add_edge("agent", END)
 
     return workflow.compile()
 
 
+# The compiled agent graph is shared by every session of the process (e.g. every Streamlit session)
+_agent: CompiledStateGraph | None = None
+
+async def get_agent() -> CompiledStateGraph:
+    """
+    Return the process-wide agent graph. The first call compiles it, and builds the
+    sub-agent graphs with the MCP tools, so later messages only pay for the LLM work.
+    """
+    global _agent
+    if _agent is None:
+        agent = await create_agent()
+        await planner_agent.get_graph()
+        await generalist_agent.get_graph()
+        _agent = agent
+    return _agent
+
+
+def invalidate_agent() -> None:
+    """
+    Drop the cached agent graph, sub-agent graphs and MCP tools; they are rebuilt on the next get_agent().
+    """
+    global _agent
+    _agent = None
+    planner_agent.invalidate_graph()
+    generalist_agent.invalidate_graph()
+    invalidate_mcp_tools()
+
+
 if __name__ == "__main__":
     import asyncio
     async def main():
-        agent = await create_agent()
+        agent = await get_agent()
 
         result = await agent.ainvoke({
             "messages": [
@@ -69,4 +152,6 @@ if __name__ == "__main__":
         })
         print(type(result))
         print(json.dumps(result, indent=2, ensure_ascii=False))
+        # No metrics server runs for the CLI, so print the plan routes
+        print("Plan routes:", json.dumps(plan_route_stats()))
     asyncio.run(main())
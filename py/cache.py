@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded LRU cache with hit/miss/eviction counters.
+    With ttl (in seconds), entries also expire that long after they were put.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        assert maxsize > 0, "maxsize must be greater than 0"
+        assert ttl is None or ttl > 0, "ttl must be greater than 0"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (value, expiry time or None)
+        self._entries: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries and not self._expired(key)
+
+    def _expired(self, key: Hashable) -> bool:
+        expires_at = self._entries[key][1]
+        return expires_at is not None and time.monotonic() >= expires_at
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                if not self._expired(key):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Return the cached value of key, creating (and caching) it with factory on a miss.
+        The factory runs outside the lock, so concurrent misses may both call it.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -2,8 +2,10 @@ import os
 from pathlib import Path
 
 import httpx
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.language_models import BaseChatModel, FakeListChatModel
 from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_openai import OpenAIEmbeddings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.tools import BaseTool
 from langchain_tavily import TavilySearch
 import yaml
@@ -18,11 +20,19 @@ with open(config_file_path, "r", encoding="utf-8") as f:
 
 
 # Load the embedding model
-embedding_model = OpenAIEmbeddings(
+# The "fake" provider is a deterministic, offline stub (used by the benchmarks)
+def create_embedding_model() -> Embeddings:
+    embedding_provider = config["embedding"].get("provider", "openai")
+    if embedding_provider == "fake":
+        return DeterministicFakeEmbedding(size=config["embedding"].get("fake_size", 1536))
+    assert embedding_provider == "openai", f"Invalid {embedding_provider = }"
+    return OpenAIEmbeddings(
         model=config["embedding"]["openai_model"],
         chunk_size=config["embedding"]["openai_batch_size"],
         max_retries=config["embedding"]["openai_max_retries"])
 
+embedding_model = create_embedding_model()
+
 embedding_length = len(embedding_model.embed_query("This is a test"))
 
 
@@ -34,6 +44,19 @@ mcp_client = MultiServerMCPClient({
     }
 })
 
+# The MCP tools are fetched once per process and shared by every agent graph
+_mcp_tools: list[BaseTool] | None = None
+
+async def get_mcp_tools() -> list[BaseTool]:
+    global _mcp_tools
+    if _mcp_tools is None:
+        _mcp_tools = await mcp_client.get_tools()
+    return _mcp_tools
+
+def invalidate_mcp_tools() -> None:
+    global _mcp_tools
+    _mcp_tools = None
+
 
 # Create the HTTP clients
 class CustomHTTPClient(httpx.Client):
@@ -50,6 +73,20 @@ httpx_client = CustomHTTPClient()
 httpx_async_client = CustomHTTPAsyncClient()
 
 
+# Create chat models
+# The "fake" provider always answers with llm.fake_responses (used by the benchmarks)
+def create_chat_model(model: str | None = None, **kwargs) -> BaseChatModel:
+    llm_provider = config["llm"].get("provider", "openai")
+    if llm_provider == "fake":
+        return FakeListChatModel(responses=config["llm"]["fake_responses"])
+    assert llm_provider == "openai", f"Invalid {llm_provider = }"
+    return ChatOpenAI(
+        model=model or config["llm"]["model"],
+        http_client=httpx_client,
+        http_async_client=httpx_async_client,
+        **kwargs)
+
+
 # Create a web search tool
 def create_web_search_tool() -> BaseTool | None:
     """
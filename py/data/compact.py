@@ -0,0 +1,137 @@
+from array import array
+from collections.abc import Sequence
+from typing import NamedTuple, overload
+
+from .definitions import Bible
+
+
+class CompactBibleVerse(NamedTuple):
+    """
+    A lightweight, read-only view of a verse in a CompactBible.
+    """
+    text: str
+    chapter: int
+    verse: int
+
+
+class CompactBibleVerses(Sequence):
+    """
+    The verses of a CompactBibleBook. Verse views are built on demand.
+    """
+
+    __slots__ = ("bible", "start", "end")
+
+    def __init__(self, bible: "CompactBible", start: int, end: int):
+        self.bible = bible
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @overload
+    def __getitem__(self, index: int) -> CompactBibleVerse: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[CompactBibleVerse]: ...
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.bible.get_verse(self.start + i)
+                    for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("verse index out of range")
+        return self.bible.get_verse(self.start + index)
+
+    def __iter__(self):
+        for i in range(self.start, self.end):
+            yield self.bible.get_verse(i)
+
+
+class CompactBibleBook:
+    """
+    A book of a CompactBible: the row range [start, end) of its verses.
+    """
+
+    __slots__ = ("bible", "book", "start", "end")
+
+    def __init__(self, bible: "CompactBible", book: str, start: int, end: int):
+        self.bible = bible
+        self.book = book
+        self.start = start
+        self.end = end
+
+    @property
+    def verses(self) -> CompactBibleVerses:
+        return CompactBibleVerses(self.bible, self.start, self.end)
+
+    @property
+    def text(self) -> str:
+        return " ".join(v.text for v in self.verses)
+
+    def iter_references(self):
+        """
+        Yield the (chapter, verse) of every verse without decoding any text.
+        """
+        return zip(
+            self.bible.chapter_numbers[self.start:self.end],
+            self.bible.verse_numbers[self.start:self.end])
+
+
+class CompactBible:
+    """
+    A Bible stored as one contiguous UTF-8 text buffer plus offset, chapter and verse columns.
+    The columns can be arrays or memoryviews over an mmap'd compiled artifact.
+    """
+
+    def __init__(
+            self,
+            version: str,
+            books: list[tuple[str, int, int]],
+            offsets: Sequence[int],
+            chapter_numbers: Sequence[int],
+            verse_numbers: Sequence[int],
+            text: bytes | memoryview,
+            buffer=None):
+        assert len(offsets) == len(chapter_numbers) + 1 == len(verse_numbers) + 1
+        self.version = version
+        self.offsets = offsets
+        self.chapter_numbers = chapter_numbers
+        self.verse_numbers = verse_numbers
+        self.text = text
+        self.books = [
+            CompactBibleBook(self, book, start, end)
+            for book, start, end in books]
+        # Keeps the mmap (if any) backing the columns alive
+        self._buffer = buffer
+
+    @classmethod
+    def from_bible(cls, bible: Bible) -> "CompactBible":
+        offsets = array("I", [0])
+        chapter_numbers = array("H")
+        verse_numbers = array("H")
+        text = bytearray()
+        books = []
+        for bible_book in bible.books:
+            start = len(chapter_numbers)
+            for bv in bible_book.verses:
+                text += bv.text.encode("utf-8")
+                offsets.append(len(text))
+                chapter_numbers.append(bv.chapter)
+                verse_numbers.append(bv.verse)
+            books.append((bible_book.book, start, len(chapter_numbers)))
+        return cls(
+            version=bible.version, books=books,
+            offsets=offsets,
+            chapter_numbers=chapter_numbers,
+            verse_numbers=verse_numbers,
+            text=bytes(text))
+
+    def __len__(self) -> int:
+        return len(self.chapter_numbers)
+
+    def get_verse(self, i: int) -> CompactBibleVerse:
+        return CompactBibleVerse(
+            text=str(self.text[self.offsets[i]:self.offsets[i + 1]], "utf-8"),
+            chapter=self.chapter_numbers[i],
+            verse=self.verse_numbers[i])
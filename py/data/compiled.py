@@ -0,0 +1,185 @@
+from array import array
+import hashlib
+import json
+import mmap
+from pathlib import Path
+import struct
+import sys
+
+from .compact import CompactBible
+from .definitions import Bible
+
+
+# A compiled Bible version is a single binary file laid out as:
+#   magic (4 bytes) | format version (u32) | header length (u32) | JSON header
+#   | offsets (u32 x n+1) | chapters (u16 x n) | verses (u16 x n) | UTF-8 text blob
+# Every section starts on an 8-byte boundary so it can be cast in place from an mmap.
+# The header records a hash of the YAML sources, so that a stale artifact can be detected.
+# Other artifacts (e.g. the lexical index) use the same layout with their own magic and sections.
+COMPILED_BIBLE_FILE = "compiled.bible"
+COMPILED_BIBLE_MAGIC = b"BSBC"
+COMPILED_BIBLE_FORMAT = 2
+
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGNMENT = 8
+
+
+def _padding(position: int) -> int:
+    return (-position) % _ALIGNMENT
+
+
+def get_compiled_bible_path(directory: Path) -> Path:
+    """
+    Return where the compiled artifact of a Bible version directory lives.
+    """
+    return directory / COMPILED_BIBLE_FILE
+
+
+def hash_bible_sources(directory: Path) -> str:
+    """
+    Hash the names and contents of the YAML files of a Bible version directory.
+    """
+    assert isinstance(directory, Path) and directory.is_dir()
+    sha = hashlib.sha256()
+    for source_path in sorted(directory.glob("*.yaml")):
+        sha.update(source_path.name.encode("utf-8") + b"\0")
+        sha.update(source_path.read_bytes())
+    return sha.hexdigest()
+
+
+def write_sections(
+        file: Path, magic: bytes, format_version: int,
+        header: dict, sections: list[tuple[str, bytes]]) -> None:
+    """
+    Write a header and binary sections in the layout of the compiled Bible.
+    The positions of the sections are added to the header.
+    """
+    # The section positions depend on the header length, so lay the header out twice
+    header = {
+        **header,
+        "byteorder": sys.byteorder,
+        "sections": {name: [0, len(data)] for name, data in sections},
+    }
+    for _ in range(2):
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        position = _PREAMBLE.size + len(header_bytes)
+        position += _padding(position)
+        for name, data in sections:
+            header["sections"][name] = [position, len(data)]
+            position += len(data) + _padding(len(data))
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with open(file, "wb") as f:
+        f.write(_PREAMBLE.pack(magic, format_version, len(header_bytes)))
+        f.write(header_bytes)
+        for name, data in sections:
+            f.write(b"\0" * (header["sections"][name][0] - f.tell()))
+            f.write(data)
+
+
+def read_sections(buffer, magic: bytes, format_version: int) -> tuple[dict, dict[str, memoryview]]:
+    """
+    Parse a file written by write_sections from a bytes-like buffer (typically an mmap)
+    without copying. Returns the header and the views of the sections.
+    """
+    view = memoryview(buffer)
+    file_magic, file_format_version, header_length = _PREAMBLE.unpack_from(view, 0)
+    assert file_magic == magic, f"Not a {magic.decode()} file"
+    assert file_format_version == format_version, f"Unsupported {magic.decode()} format {file_format_version}"
+    header = json.loads(bytes(view[_PREAMBLE.size:_PREAMBLE.size + header_length]))
+    assert header["byteorder"] == sys.byteorder, "The file was written on a host with a different byte order"
+    return header, {
+        name: view[position:position + length]
+        for name, (position, length) in header["sections"].items()}
+
+
+def read_header(file: Path, magic: bytes, format_version: int) -> dict | None:
+    """
+    Read the header of a file written by write_sections, or return None if the file has another format.
+    """
+    with open(file, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            return None
+        file_magic, file_format_version, header_length = _PREAMBLE.unpack(preamble)
+        if file_magic != magic or file_format_version != format_version:
+            return None
+        return json.loads(f.read(header_length))
+
+
+def map_file(file: Path) -> mmap.mmap:
+    assert isinstance(file, Path) and file.is_file()
+    with open(file, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def compile_bible(bible: Bible | CompactBible, file: Path, sources_hash: str | None = None) -> None:
+    """
+    Compile a Bible into a binary, memory-mappable artifact.
+    sources_hash is the hash_bible_sources of the directory the Bible was loaded from.
+    """
+    if not isinstance(bible, CompactBible):
+        bible = CompactBible.from_bible(bible)
+
+    header = {
+        "version": bible.version,
+        "n_verses": len(bible),
+        "sources_hash": sources_hash,
+        "books": [
+            {"book": bb.book, "start": bb.start, "end": bb.end}
+            for bb in bible.books],
+    }
+    write_sections(file, COMPILED_BIBLE_MAGIC, COMPILED_BIBLE_FORMAT, header, [
+        ("offsets", array("I", bible.offsets).tobytes()),
+        ("chapters", array("H", bible.chapter_numbers).tobytes()),
+        ("verses", array("H", bible.verse_numbers).tobytes()),
+        ("text", bytes(bible.text)),
+    ])
+
+
+def read_compiled_bible(buffer) -> tuple[dict, memoryview, memoryview, memoryview, memoryview]:
+    """
+    Parse a compiled Bible from a bytes-like buffer (typically an mmap) without copying.
+    Returns the header and the offsets, chapters, verses and text views.
+    """
+    header, sections = read_sections(buffer, COMPILED_BIBLE_MAGIC, COMPILED_BIBLE_FORMAT)
+    return (
+        header,
+        sections["offsets"].cast("I"),
+        sections["chapters"].cast("H"),
+        sections["verses"].cast("H"),
+        sections["text"],
+    )
+
+
+def read_compiled_bible_header(file: Path) -> dict | None:
+    """
+    Read the header of a compiled Bible, or return None if the file has another format.
+    """
+    return read_header(file, COMPILED_BIBLE_MAGIC, COMPILED_BIBLE_FORMAT)
+
+
+def is_compiled_bible_current(file: Path, directory: Path) -> bool:
+    """
+    Check that a compiled Bible was compiled from the current YAML files of its directory.
+    """
+    header = read_compiled_bible_header(file)
+    return header is not None and header.get("sources_hash") == hash_bible_sources(directory)
+
+
+def load_compiled_bible(file: Path) -> CompactBible:
+    """
+    Memory-map the compiled artifact of a Bible. Verse text is only decoded when it is read.
+    """
+    mm = map_file(file)
+    header, offsets, chapter_numbers, verse_numbers, text = read_compiled_bible(mm)
+    return CompactBible(
+        version=header["version"],
+        books=[(book["book"], book["start"], book["end"])
+               for book in header["books"]],
+        offsets=offsets,
+        chapter_numbers=chapter_numbers,
+        verse_numbers=verse_numbers,
+        text=text,
+        buffer=mm)
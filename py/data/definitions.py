@@ -1,5 +1,5 @@
-from abc import abstractmethod
-import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
 from enum import Enum
 from pydantic import BaseModel, Field
 from typing import Annotated, TypedDict, Union
@@ -208,6 +208,18 @@ class Bible(BaseModel):
     version: str
 
 
+class BibleVerseRange(BaseModel):
+    """
+    A verse range requested through the MCP tools; to_chapter and to_verse default to the start.
+    """
+    book: str
+    from_chapter: int
+    from_verse: int
+    to_chapter: int | None = None
+    to_verse: int | None = None
+    version: str | None = None
+
+
 class AgentRunStatus(str, Enum):
     RUNNING = "running"
     SUCCESS = "success"
@@ -217,37 +229,78 @@ class AgentRunStatus(str, Enum):
 class AgentState(TypedDict):
     messages: Annotated[list, _reduce_list]
     plan: Annotated[dict[str, dict], _merge_dict]
+    # Quotes (TextChunk dicts) of the scripture references in the user request
+    references: Annotated[list, _reduce_list]
 
 
-class BSBAgent:
+class BSBAgent(ABC):
     targeted_services: list[str] | None = None
 
     def __init__ (self, *args, **kwargs):
-        self.graph = asyncio.run(self._create_graph())
-    
+        # The compiled graph is built on first use and shared by every session of the process
+        self._graph = None
+
     @abstractmethod
     async def _create_graph(self) -> StateGraph:
         pass
+
+    async def get_graph(self) -> StateGraph:
+        """
+        Return the compiled graph, building it on the first call.
+        """
+        if self._graph is None:
+            self._graph = await self._create_graph()
+        return self._graph
+
+    def invalidate_graph(self) -> None:
+        """
+        Drop the compiled graph, so that the next call rebuilds it (e.g. with new MCP tools).
+        """
+        self._graph = None
     
     @abstractmethod
-    async def invoke(
-            self, state: AgentState) -> dict:
+    async def ainvoke(
+            self, state: AgentState, config: dict | None = None) -> dict:
+        """
+        Run the agent as a node of the agent graph and return its state update.
+        """
         pass
 
-    def _find_task(self, state: AgentState) -> int | None:
+    def _find_task(self, state: AgentState) -> str | None:
         """
-        Find the task in the plan DAG.
+        Find the first task of the plan DAG (breadth-first) that targets a service of this agent and has not run yet.
         """
         assert "plan" in state, "plan not in state"
 
         if self.targeted_services is None:
             return None
-        to_check = [state["plan"]["root"]]
+        nodes = state["plan"]["nodes"]
+        to_check = deque([str(state["plan"]["root"])])
+        visited = set()
         while len(to_check) > 0:
-            node_id = to_check.pop(0)
-            if node := state["plan"]["nodes"].get(node_id):
+            node_id = to_check.popleft()
+            # A node reached twice (a shared child or a cycle) is only checked once
+            if node_id in visited:
+                continue
+            visited.add(node_id)
+            if node := nodes.get(node_id):
                 if node["service"] in self.targeted_services:
-                    if "status" not in "service":
+                    if "status" not in node:
                         return node_id
-                to_check = to_check + node.get("children", [])
-        return None
\ No newline at end of file
+                to_check.extend(str(child_id) for child_id in node.get("children", []))
+        return None
+
+
+class BSBTaskAgent(BSBAgent):
+    """
+    An agent running the tasks of a plan for its targeted services (see PlanExecutor).
+    """
+
+    @abstractmethod
+    async def arun_task(
+            self, task_input: str, context_messages: list, config: dict | None = None) -> list[dict]:
+        """
+        Run one task of a plan, after the context messages (e.g. the answers of the tasks it
+        depends on), and return the new messages.
+        """
+        pass
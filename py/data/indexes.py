@@ -0,0 +1,146 @@
+from .compact import CompactBible, CompactBibleBook, CompactBibleVerse
+from .definitions import Bible, BibleBook, BibleVerse
+
+CONTEXT_SCOPES = ["book", "chapter", "verse"]
+
+
+def _iter_references(bible_book: BibleBook | CompactBibleBook):
+    if isinstance(bible_book, CompactBibleBook):
+        return bible_book.iter_references()
+    return ((bv.chapter, bv.verse) for bv in bible_book.verses)
+
+
+def _same_references(
+        bible_book: BibleBook | CompactBibleBook,
+        other_book: BibleBook | CompactBibleBook) -> bool:
+    if isinstance(bible_book, CompactBibleBook) and isinstance(other_book, CompactBibleBook):
+        # Compare the chapter and verse columns without building the references
+        a, b = bible_book, other_book
+        return (
+            a.end - a.start == b.end - b.start
+            and memoryview(a.bible.chapter_numbers)[a.start:a.end] == memoryview(b.bible.chapter_numbers)[b.start:b.end]
+            and memoryview(a.bible.verse_numbers)[a.start:a.end] == memoryview(b.bible.verse_numbers)[b.start:b.end])
+    return list(_iter_references(bible_book)) == list(_iter_references(other_book))
+
+
+class BibleBookIndex:
+    """
+    A (chapter, verse) -> offset index over the verses of a BibleBook, with the
+    [start, end) offsets of every chapter.
+    Verse range and context lookups become dict hits plus one slice.
+    Pass the index of a book with the same references as structure to share its
+    offsets instead of building them again.
+    """
+
+    def __init__(
+            self,
+            bible_book: BibleBook | CompactBibleBook,
+            structure: "BibleBookIndex | None" = None):
+        self.bible_book = bible_book
+        if structure is not None:
+            self.offsets = structure.offsets
+            self.chapter_bounds = structure.chapter_bounds
+            self.n_verses = structure.n_verses
+            return
+        self.offsets: dict[int, dict[int, int]] = {}
+        self.chapter_bounds: dict[int, tuple[int, int]] = {}
+        n_verses = 0
+        for offset, (chapter, verse) in enumerate(_iter_references(bible_book)):
+            self.offsets.setdefault(chapter, {})[verse] = offset
+            # The verses are sorted, so the verses of a chapter are contiguous
+            chapter_start, _ = self.chapter_bounds.get(chapter, (offset, offset))
+            self.chapter_bounds[chapter] = (chapter_start, offset + 1)
+            n_verses = offset + 1
+        self.n_verses = n_verses
+
+    @property
+    def book(self) -> str:
+        return self.bible_book.book
+
+    def locate(self, chapter: int, verse: int) -> int:
+        """
+        Return the offset of the verse (chapter, verse) in the book.
+        """
+        chapter_offsets = self.offsets.get(chapter)
+        assert chapter_offsets is not None, f"Invalid chapter {self.book} {chapter}"
+        offset = chapter_offsets.get(verse)
+        assert offset is not None, f"Invalid verse {self.book} {chapter}:{verse}"
+        return offset
+
+    def get_verses(
+            self,
+            from_chapter: int, from_verse: int,
+            to_chapter: int, to_verse: int) -> list[BibleVerse | CompactBibleVerse]:
+        """
+        Return the verses from (from_chapter, from_verse) to (to_chapter, to_verse), inclusive.
+        """
+        i_from = self.locate(from_chapter, from_verse)
+        i_to = self.locate(to_chapter, to_verse)
+        assert i_from <= i_to, "Invalid verse range: 'from' is after 'to'"
+        return list(self.bible_book.verses[i_from:i_to + 1])
+
+    def get_verse_context(
+            self,
+            chapter: int, verse: int,
+            context_scope: str = "chapter",
+            n_prev_context_verses: int = 2,
+            n_next_context_verses: int = 2) -> list[BibleVerse | CompactBibleVerse]:
+        """
+        Return the verse (chapter, verse) with up to n_prev_context_verses verses before it
+        and n_next_context_verses verses after it, kept within the same book, the same
+        chapter, or the verse itself, depending on context_scope.
+        """
+        assert context_scope in CONTEXT_SCOPES, f"Invalid {context_scope = }"
+        assert n_prev_context_verses >= 0 and n_next_context_verses >= 0
+        offset = self.locate(chapter, verse)
+        if context_scope == "book":
+            scope_start, scope_end = 0, self.n_verses
+        elif context_scope == "chapter":
+            scope_start, scope_end = self.chapter_bounds[chapter]
+        else:
+            scope_start, scope_end = offset, offset + 1
+        i_from = max(scope_start, offset - n_prev_context_verses)
+        i_to = min(scope_end, offset + 1 + n_next_context_verses)
+        return list(self.bible_book.verses[i_from:i_to])
+
+
+class BibleIndex:
+    """
+    Per-version index: book name -> BibleBookIndex.
+    The books with the same references as in structure (e.g. the shared skeleton of
+    ParallelBibleIndex) share its offsets, so that they only cost their text.
+    """
+
+    def __init__(self, bible: Bible | CompactBible, structure: "BibleIndex | None" = None):
+        self.version = bible.version
+        self.books: dict[str, BibleBookIndex] = {}
+        for bb in bible.books:
+            shared = structure.books.get(bb.book) if structure is not None else None
+            if shared is not None and not _same_references(bb, shared.bible_book):
+                shared = None
+            self.books[bb.book] = BibleBookIndex(bb, structure=shared)
+
+    @property
+    def book_names(self) -> list[str]:
+        return list(self.books.keys())
+
+    def get_book(self, book: str) -> BibleBookIndex:
+        book_index = self.books.get(book)
+        assert book_index is not None, "Invalid book name. Valid names are: " + ", ".join(self.books.keys())
+        return book_index
+
+    def get_verses(
+            self, book: str,
+            from_chapter: int, from_verse: int,
+            to_chapter: int, to_verse: int) -> list[BibleVerse | CompactBibleVerse]:
+        return self.get_book(book).get_verses(
+            from_chapter, from_verse, to_chapter, to_verse)
+
+    def get_verse_context(
+            self, book: str,
+            chapter: int, verse: int,
+            context_scope: str = "chapter",
+            n_prev_context_verses: int = 2,
+            n_next_context_verses: int = 2) -> list[BibleVerse | CompactBibleVerse]:
+        return self.get_book(book).get_verse_context(
+            chapter, verse, context_scope, n_prev_context_verses, n_next_context_verses)
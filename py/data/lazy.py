@@ -0,0 +1,134 @@
+import json
+import logging
+from pathlib import Path
+
+from cache import LRUCache
+from metrics import timed
+from .compact import CompactBible
+from .compiled import hash_bible_sources
+from .definitions import BIBLE_BOOKS, Bible
+from .indexes import BibleBookIndex
+from .loaders import _get_bible_version_from_path, load_bible_book_from_file
+
+
+logger = logging.getLogger(__name__)
+
+BIBLE_MANIFEST_FILE = "manifest.json"
+
+
+def get_bible_manifest_path(directory: Path) -> Path:
+    return directory / BIBLE_MANIFEST_FILE
+
+
+def build_bible_manifest(directory: Path) -> dict:
+    """
+    Build the manifest of a Bible version directory: for every book, its YAML file and
+    the number of verses in each chapter. Books are loaded one at a time and dropped.
+    The manifest records a hash of the YAML files, so that a stale manifest can be detected.
+    """
+    assert isinstance(directory, Path) and directory.is_dir()
+    books = {}
+    for book_path in sorted(directory.glob("*.yaml")):
+        bible_book = load_bible_book_from_file(book_path)
+        if bible_book.book not in BIBLE_BOOKS:
+            continue
+        chapters: dict[int, int] = {}
+        for bv in bible_book.verses:
+            chapters[bv.chapter] = chapters.get(bv.chapter, 0) + 1
+        books[bible_book.book] = {
+            "file": book_path.name,
+            "chapters": chapters,
+        }
+    return {
+        "version": _get_bible_version_from_path(directory),
+        "sources_hash": hash_bible_sources(directory),
+        "books": dict(sorted(books.items(), key=lambda kv: BIBLE_BOOKS.index(kv[0]))),
+    }
+
+
+def write_bible_manifest(directory: Path) -> Path:
+    manifest_path = get_bible_manifest_path(directory)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(build_bible_manifest(directory), f, ensure_ascii=False, indent=2)
+    return manifest_path
+
+
+def load_bible_manifest(directory: Path) -> dict:
+    """
+    Read the manifest of a Bible version directory, building it when there is no manifest
+    file or when the YAML files changed since it was written.
+    """
+    manifest_path = get_bible_manifest_path(directory)
+    if not manifest_path.is_file():
+        logger.warning("No %s in %s, building the manifest from the YAML files", BIBLE_MANIFEST_FILE, directory)
+        return build_bible_manifest(directory)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("sources_hash") != hash_bible_sources(directory):
+        logger.warning("The manifest %s is stale, building the manifest from the YAML files; "
+                       "run scripts/compile-data.py to rewrite it", manifest_path)
+        return build_bible_manifest(directory)
+    # JSON object keys are strings
+    for book_manifest in manifest["books"].values():
+        book_manifest["chapters"] = {
+            int(ch): n for ch, n in book_manifest["chapters"].items()}
+    return manifest
+
+
+class LazyBibleIndex:
+    """
+    A drop-in for BibleIndex that only keeps the manifest of a Bible version resident.
+    Books are loaded on first access and kept in a size-bounded LRU cache.
+    """
+
+    def __init__(self, directory: Path, max_books: int = 8):
+        assert isinstance(directory, Path) and directory.is_dir()
+        self.directory = directory
+        self.manifest = load_bible_manifest(directory)
+        self.version = self.manifest["version"]
+        self._books = LRUCache(maxsize=max_books)
+
+    @property
+    def book_names(self) -> list[str]:
+        return list(self.manifest["books"].keys())
+
+    def _load_book(self, book: str) -> BibleBookIndex:
+        logger.info("Loading the book of %s (%s)", book, self.version)
+        with timed("book_load", version=self.version):
+            bible_book = load_bible_book_from_file(
+                self.directory / self.manifest["books"][book]["file"])
+        compact_bible = CompactBible.from_bible(
+            Bible.model_construct(version=self.version, books=[bible_book]))
+        return BibleBookIndex(compact_bible.books[0])
+
+    def get_book(self, book: str) -> BibleBookIndex:
+        assert book in self.manifest["books"], "Invalid book name. Valid names are: " + ", ".join(self.book_names)
+        return self._books.get_or_create(book, lambda: self._load_book(book))
+
+    def get_verses(
+            self, book: str,
+            from_chapter: int, from_verse: int,
+            to_chapter: int, to_verse: int) -> list:
+        # Check the chapters against the manifest before loading the book
+        book_manifest = self.manifest["books"].get(book)
+        if book_manifest is not None:
+            assert from_chapter in book_manifest["chapters"], f"Invalid chapter {book} {from_chapter}"
+            assert to_chapter in book_manifest["chapters"], f"Invalid chapter {book} {to_chapter}"
+        return self.get_book(book).get_verses(
+            from_chapter, from_verse, to_chapter, to_verse)
+
+    def get_verse_context(
+            self, book: str,
+            chapter: int, verse: int,
+            context_scope: str = "chapter",
+            n_prev_context_verses: int = 2,
+            n_next_context_verses: int = 2) -> list:
+        # Check the chapter against the manifest before loading the book
+        book_manifest = self.manifest["books"].get(book)
+        if book_manifest is not None:
+            assert chapter in book_manifest["chapters"], f"Invalid chapter {book} {chapter}"
+        return self.get_book(book).get_verse_context(
+            chapter, verse, context_scope, n_prev_context_verses, n_next_context_verses)
+
+    def stats(self) -> dict:
+        return self._books.stats()
@@ -0,0 +1,216 @@
+from array import array
+from collections import Counter
+import heapq
+import math
+from pathlib import Path
+from typing import Sequence
+
+from .compact import CompactBible
+from .compiled import hash_bible_sources, map_file, read_header, read_sections, write_sections
+from .definitions import Bible
+from .splitters import split_bible_book
+from .utils import char_ngrams
+
+
+# The lexical index of a Bible version is saved next to its compiled artifact
+LEXICAL_INDEX_FILE = "lexical.index"
+LEXICAL_INDEX_MAGIC = b"BSBL"
+LEXICAL_INDEX_FORMAT = 1
+
+
+class LexicalIndex:
+    """
+    A BM25 inverted index over character n-grams of text chunk payloads
+    (dicts with at least a "text" key).
+    The postings of term i are doc_ids and tfs[term_offsets[i]:term_offsets[i + 1]].
+    """
+
+    def __init__(self, payloads: list[dict], k1: float = 1.5, b: float = 0.75):
+        doc_lengths = array("I")
+        postings: dict[str, tuple[array, array]] = {}
+        for doc_id, payload in enumerate(payloads):
+            terms = Counter(char_ngrams(payload["text"]))
+            doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                if term not in postings:
+                    postings[term] = (array("I"), array("I"))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        term_offsets = array("I", [0])
+        doc_ids = array("I")
+        tfs = array("I")
+        for term_doc_ids, term_tfs in postings.values():
+            doc_ids.extend(term_doc_ids)
+            tfs.extend(term_tfs)
+            term_offsets.append(len(doc_ids))
+        self._set_columns(
+            payloads, list(postings.keys()), term_offsets, doc_ids, tfs, doc_lengths, k1, b)
+
+    def _set_columns(
+            self, payloads: list[dict], terms: list[str],
+            term_offsets: Sequence[int], doc_ids: Sequence[int], tfs: Sequence[int],
+            doc_lengths: Sequence[int], k1: float, b: float) -> None:
+        self.payloads = payloads
+        self.k1 = k1
+        self.b = b
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.avg_doc_length = (sum(doc_lengths) / len(payloads) if payloads else 0.0) or 1.0
+
+    @classmethod
+    def from_columns(
+            cls, payloads: list[dict], terms: list[str],
+            term_offsets: Sequence[int], doc_ids: Sequence[int], tfs: Sequence[int],
+            doc_lengths: Sequence[int], k1: float = 1.5, b: float = 0.75) -> "LexicalIndex":
+        """
+        Create an index from its (e.g. memory-mapped) columns, without indexing the payloads.
+        """
+        index = cls.__new__(cls)
+        index._set_columns(payloads, terms, term_offsets, doc_ids, tfs, doc_lengths, k1, b)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def _posting(self, term: str) -> tuple[Sequence[int], Sequence[int]] | None:
+        i = self.terms.get(term)
+        if i is None:
+            return None
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def scores(self, query: str) -> dict[int, float]:
+        """
+        Return the BM25 score of every document sharing at least one n-gram with the query.
+        """
+        n_docs = len(self.payloads)
+        scores: dict[int, float] = {}
+        for term in set(char_ngrams(query)):
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            doc_ids, tfs = posting
+            df = len(doc_ids)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in zip(doc_ids, tfs):
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return scores
+
+    def term_coverage(self, terms: set[str]) -> dict[int, float]:
+        """
+        Return the fraction of the terms found in every document containing at least one
+        of them. Unlike BM25 scores, it does not depend on the other documents.
+        """
+        n_matched: dict[int, int] = {}
+        for term in terms:
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            for doc_id in posting[0]:
+                n_matched[doc_id] = n_matched.get(doc_id, 0) + 1
+        return {doc_id: n / len(terms) for doc_id, n in n_matched.items()}
+
+    def search_with_scores(
+            self, query: str, top_k: int = 30, filters: dict | None = None) -> list[tuple[float, dict]]:
+        """
+        Return the BM25 scores and payloads of the top_k documents for the query, best first.
+        filters keeps only the payloads whose keys equal the given values.
+        """
+        scores = self.scores(query)
+        if filters:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if all(self.payloads[doc_id].get(k) == v for k, v in filters.items())}
+        top = heapq.nlargest(top_k, scores.items(), key=lambda ds: ds[1])
+        return [(score, self.payloads[doc_id]) for doc_id, score in top]
+
+    def search(self, query: str, top_k: int = 30, filters: dict | None = None) -> list[dict]:
+        """
+        Return the payloads of the top_k documents for the query, best first.
+        filters keeps only the payloads whose keys equal the given values.
+        """
+        return [payload for _, payload in self.search_with_scores(query, top_k, filters)]
+
+
+def search_lexical_indexes(
+        indexes: list[LexicalIndex], query: str,
+        top_k: int = 30, filters: dict | None = None) -> list[dict]:
+    """
+    Search several indexes (e.g. one per Bible version) and merge their results by score.
+    """
+    results = [
+        scored_payload
+        for index in indexes
+        for scored_payload in index.search_with_scores(query, top_k, filters)]
+    return [payload for _, payload in heapq.nlargest(top_k, results, key=lambda sp: sp[0])]
+
+
+def build_bible_lexical_index(bible: Bible | CompactBible) -> LexicalIndex:
+    """
+    Index the same chunks as build-data.py, with the same payload keys as the vector store.
+    """
+    payloads = []
+    for bible_book in bible.books:
+        for chunk in split_bible_book(bible_book):
+            payloads.append({
+                "text": chunk.text,
+                **chunk.metadata,
+                "category": "bible",
+                "version": bible.version})
+    return LexicalIndex(payloads)
+
+
+def get_lexical_index_path(directory: Path) -> Path:
+    return directory / LEXICAL_INDEX_FILE
+
+
+def save_lexical_index(index: LexicalIndex, file: Path, sources_hash: str | None = None) -> None:
+    """
+    Save a lexical index in the memory-mappable layout of the compiled Bible.
+    sources_hash is the hash_bible_sources of the directory the chunks were split from.
+    """
+    header = {
+        "sources_hash": sources_hash,
+        "k1": index.k1,
+        "b": index.b,
+        "payloads": index.payloads,
+        "terms": list(index.terms.keys()),
+    }
+    write_sections(file, LEXICAL_INDEX_MAGIC, LEXICAL_INDEX_FORMAT, header, [
+        ("term_offsets", array("I", index.term_offsets).tobytes()),
+        ("doc_ids", array("I", index.doc_ids).tobytes()),
+        ("tfs", array("I", index.tfs).tobytes()),
+        ("doc_lengths", array("I", index.doc_lengths).tobytes()),
+    ])
+
+
+def is_lexical_index_current(file: Path, directory: Path) -> bool:
+    """
+    Check that a lexical index was built from the current YAML files of its Bible version directory.
+    """
+    header = read_header(file, LEXICAL_INDEX_MAGIC, LEXICAL_INDEX_FORMAT)
+    return header is not None and header.get("sources_hash") == hash_bible_sources(directory)
+
+
+def load_lexical_index(file: Path) -> LexicalIndex:
+    """
+    Memory-map a saved lexical index; only the payloads and the terms are parsed.
+    """
+    mm = map_file(file)
+    header, sections = read_sections(mm, LEXICAL_INDEX_MAGIC, LEXICAL_INDEX_FORMAT)
+    index = LexicalIndex.from_columns(
+        payloads=header["payloads"],
+        terms=header["terms"],
+        term_offsets=sections["term_offsets"].cast("I"),
+        doc_ids=sections["doc_ids"].cast("I"),
+        tfs=sections["tfs"].cast("I"),
+        doc_lengths=sections["doc_lengths"].cast("I"),
+        k1=header["k1"], b=header["b"])
+    # Keeps the mmap backing the columns alive
+    index._buffer = mm
+    return index
@@ -1,8 +1,24 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import logging
 from pathlib import Path 
+import time
 import yaml 
 
+from .compact import CompactBible
+from .compiled import get_compiled_bible_path, is_compiled_bible_current, load_compiled_bible
 from .definitions import BIBLE_BOOKS, Bible, BibleBook
+from .indexes import BibleBookIndex
+
+
+logger = logging.getLogger(__name__)
+
+# Use the libyaml-backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+LOADER_EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
 
 
 def _get_bible_version_from_path(
@@ -19,30 +35,44 @@ def load_bible_book_from_file (
     """
     assert isinstance(file, Path) and file.is_file()
     with open(file, "r", encoding=encoding) as f: 
-        bible_book = BibleBook(**yaml.safe_load(f))
+        bible_book = BibleBook(**yaml.load(f, Loader=_YAML_LOADER))
         bible_book.verses = sorted(
             bible_book.verses,
             key=lambda v: (v.chapter, v.verse))
         return bible_book
 
 
-def load_bible_from_dir (
-        directory :Path
-) -> Bible: 
+def _load_bible_book_timed (
+        file :Path
+) -> tuple[BibleBook, float]: 
+    start_time = time.perf_counter()
+    bible_book = load_bible_book_from_file(file)
+    return bible_book, time.perf_counter() - start_time
+
+
+def load_bible_from_dir_with_timings (
+        directory :Path, 
+        executor :str = "thread", 
+        max_workers :int | None = None
+) -> tuple[Bible, dict[str, float]]: 
     """
-    Load a Bible, a list of bible books, from a directory
+    Load a Bible, a list of bible books, from a directory. 
+    Also return the time (in seconds) spent loading each book, keyed by book name. 
+    executor is "thread" or "process"; use "process" to parse the books on multiple cores. 
     """
     assert isinstance(directory, Path) and directory.is_dir()
+    assert executor in LOADER_EXECUTORS, f"Invalid {executor = }"
 
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(load_bible_book_from_file, book_path)
+    with LOADER_EXECUTORS[executor](max_workers=max_workers) as pool:
+        futures = [pool.submit(_load_bible_book_timed, book_path)
                    for book_path in directory.glob("*.yaml")]
-        books = [
+        results = [
             future.result()
             for future in futures]
+    timings = {bb.book: seconds for bb, seconds in results}
     
     # Sort the bible books
-    books = [bb for bb in books if bb.book in BIBLE_BOOKS]
+    books = [bb for bb, _ in results if bb.book in BIBLE_BOOKS]
     books = sorted(
         books, key=lambda bb: BIBLE_BOOKS.index(bb.book))
     
@@ -50,11 +80,55 @@ def load_bible_from_dir (
         version=_get_bible_version_from_path(directory),
         books=books)
 
+    return bible, timings
+
+
+def load_bible_from_dir (
+        directory :Path, 
+        executor :str = "thread", 
+        max_workers :int | None = None
+) -> Bible: 
+    """
+    Load a Bible, a list of bible books, from a directory
+    """
+    bible, _ = load_bible_from_dir_with_timings(
+        directory, executor=executor, max_workers=max_workers)
     return bible
 
 
+def load_bible (
+        directory :Path, 
+        executor :str = "thread", 
+        max_workers :int | None = None
+) -> CompactBible: 
+    """
+    Load a CompactBible from the compiled artifact of a directory, falling back to its YAML files 
+    when there is no artifact or it was compiled from other YAML files. 
+    executor and max_workers configure the YAML fallback, see load_bible_from_dir_with_timings.
+    """
+    assert isinstance(directory, Path) and directory.is_dir()
+
+    compiled_path = get_compiled_bible_path(directory)
+    if compiled_path.is_file():
+        if is_compiled_bible_current(compiled_path, directory):
+            logger.info("Loading the compiled Bible %s", compiled_path)
+            return load_compiled_bible(compiled_path)
+        logger.warning("The compiled Bible %s is stale or has an old format, loading from YAML; "
+                       "run scripts/compile-data.py to recompile it", compiled_path)
+    else:
+        logger.info("No compiled Bible in %s, loading from YAML", directory)
+    start_time = time.perf_counter()
+    bible, timings = load_bible_from_dir_with_timings(
+        directory, executor=executor, max_workers=max_workers)
+    slowest_books = sorted(timings.items(), key=lambda bt: bt[1], reverse=True)[:5]
+    logger.info("Loaded %s from YAML in %.2fs (%s executor); slowest books: %s",
+                bible.version, time.perf_counter() - start_time, executor,
+                ", ".join(f"{book} {seconds:.2f}s" for book, seconds in slowest_books))
+    return CompactBible.from_bible(bible)
+
+
 def load_verse_context (
-        bible_book :BibleBook, 
+        bible_book :BibleBook | BibleBookIndex, 
         chapter :int, 
         verse :int, 
         context_scope :str, # "book", "chapter", or "verse"
@@ -66,44 +140,11 @@ def load_verse_context (
     Here is how the context being generated: 
     1. Load n_prev_context_verses verses before the targeted verse (chapter, verse), the verse itself, and n_next_context_verses after the targeted verse. 
     2. Chop the verses loaded from the previous step by context_scope. If context_scope is "book", verses of the same book of the targeted verse will be include. Similarly, if context_scope is "chapter", verses of the same chapter will be included. If context_scope is "verse", the targeted verse itself is included.
+    Pass a BibleBookIndex instead of a BibleBook to avoid indexing the book on every call. 
     """
-    # Check parameters 
-    assert(n_prev_context_verses >= 0)
-    assert(n_next_context_verses >= 0)
-
-    # Located the targeted verse 
-    i_targeted_verse = 0 
-    while (i_targeted_verse < len(bible_book.verses)): 
-        targeted_verse = bible_book.verses[i_targeted_verse]
-        if (targeted_verse.metadata["chapter"] == chapter and targeted_verse.metadata["verse"] == verse): 
-            break # the targeted verse located 
-        i_targeted_verse += 1
-
-    assert(i_targeted_verse < len(bible_book.verses)), f"The targeted verse {bible_book.metadata['book']}{chapter}:{verse} not found"
-
-    # Load the surrounding verses 
-    i_from = max(0, i_targeted_verse - n_prev_context_verses) 
-    i_to = min(len(bible_book.verses), i_targeted_verse + 1 + n_next_context_verses)
-
-    context_verses = bible_book.verses[i_from : i_to]
-
-    # chop the verses based on context_scope 
-    if (context_scope == "book"): 
-        pass 
-
-    elif (context_scope == "chapter"): 
-        context_verses = list(filter(
-            lambda cv: cv.metadata["chapter"] == chapter
-        ))
-
-    elif (context_scope == "verse"): 
-        context_verses = bible_book.verses[i_targeted_verse:i_targeted_verse+1]
-
-    else: 
-        assert(False), f"Invalid {context_scope = }"
-
-    # return 
-    return " ".join(list(map(
-        lambda cv: cv.text, 
-        context_verses 
-    )))
+    book_index = bible_book if isinstance(bible_book, BibleBookIndex) else BibleBookIndex(bible_book)
+    context_verses = book_index.get_verse_context(
+        chapter, verse, context_scope,
+        n_prev_context_verses=n_prev_context_verses,
+        n_next_context_verses=n_next_context_verses)
+    return " ".join(cv.text for cv in context_verses)
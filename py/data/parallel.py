@@ -0,0 +1,186 @@
+from array import array
+import json
+import logging
+from pathlib import Path
+import re
+from typing import NamedTuple
+
+from .compact import CompactBible
+from .definitions import BIBLE_BOOKS
+from .indexes import BibleIndex
+
+
+logger = logging.getLogger(__name__)
+
+VERSIFICATION_FILE = "versification.json"
+SKELETON_VERSION = "skeleton"
+
+_REFERENCE_PATTERN = re.compile(r"^\s*(\S+)\s+(\d+):(\d+)\s*$")
+
+Reference = tuple[str, int, int]
+
+
+class ParallelBibleVerse(NamedTuple):
+    """
+    A verse of the shared skeleton, with its text in every requested version
+    (None for the versions without that verse).
+    """
+    chapter: int
+    verse: int
+    texts: dict[str, str | None]
+
+
+def _parse_reference(text: str) -> Reference:
+    match = _REFERENCE_PATTERN.match(text)
+    assert match is not None, f"Invalid reference {text!r}, expected '<book> <chapter>:<verse>'"
+    book = match[1].lower()
+    assert book in BIBLE_BOOKS, f"Invalid book name {book!r} in reference {text!r}"
+    return book, int(match[2]), int(match[3])
+
+
+def load_versification(directory: Path) -> dict[Reference, Reference]:
+    """
+    Read the versification map of a Bible version directory, from the references of the
+    version to the shared references, e.g. {"malachi 3:19": "malachi 4:1"}.
+    Verses not in the map keep their reference, and there is no map without the file.
+    """
+    versification_path = directory / VERSIFICATION_FILE
+    if not versification_path.is_file():
+        return {}
+    with open(versification_path, "r", encoding="utf-8") as f:
+        versification = json.load(f)
+    return {
+        _parse_reference(reference): _parse_reference(shared_reference)
+        for reference, shared_reference in versification.items()}
+
+
+def _iter_shared_references(
+        bible: CompactBible,
+        versification: dict[Reference, Reference]):
+    """
+    Yield the row and the shared reference of every verse of a version.
+    """
+    for bible_book in bible.books:
+        for i in range(bible_book.start, bible_book.end):
+            reference = (bible_book.book, bible.chapter_numbers[i], bible.verse_numbers[i])
+            yield i, versification.get(reference, reference)
+
+
+def _build_skeleton(
+        bibles: list[CompactBible],
+        versifications: dict[str, dict[Reference, Reference]]) -> CompactBible:
+    """
+    Build a CompactBible without text over the union of the shared references of the versions.
+    """
+    references: dict[str, set[tuple[int, int]]] = {}
+    for bible in bibles:
+        versification = versifications.get(bible.version, {})
+        for _, (book, chapter, verse) in _iter_shared_references(bible, versification):
+            references.setdefault(book, set()).add((chapter, verse))
+
+    chapter_numbers = array("H")
+    verse_numbers = array("H")
+    books = []
+    for book in sorted(references, key=BIBLE_BOOKS.index):
+        start = len(chapter_numbers)
+        for chapter, verse in sorted(references[book]):
+            chapter_numbers.append(chapter)
+            verse_numbers.append(verse)
+        books.append((book, start, len(chapter_numbers)))
+    return CompactBible(
+        version=SKELETON_VERSION, books=books,
+        offsets=array("I", bytes(4 * (len(chapter_numbers) + 1))),
+        chapter_numbers=chapter_numbers,
+        verse_numbers=verse_numbers,
+        text=b"")
+
+
+class ParallelBibleIndex:
+    """
+    Side-by-side (interlinear) access to several Bible versions through one shared
+    skeleton: the book/chapter/verse references of all the versions, mapped by their
+    versification, held once as a CompactBible without text and its BibleIndex.
+    A version with the references of the skeleton reads the skeleton's rows directly,
+    so it costs only its text; any other version gets one row array, from the rows of
+    the skeleton to its own verses (-1 where it has no such verse).
+    A range is located once in the skeleton, whatever the number of versions.
+    """
+
+    def __init__(
+            self,
+            bibles: list[CompactBible],
+            versifications: dict[str, dict[Reference, Reference]] | None = None):
+        assert len(bibles) > 0
+        versifications = versifications or {}
+        skeleton_bible = _build_skeleton(bibles, versifications)
+        self.skeleton = BibleIndex(skeleton_bible)
+
+        self.bibles: dict[str, CompactBible] = {}
+        self._rows: dict[str, array | None] = {}
+        for bible in bibles:
+            assert bible.version not in self.bibles, f"Duplicated version {bible.version}"
+            self.bibles[bible.version] = bible
+            versification = versifications.get(bible.version, {})
+            if not versification and self._has_skeleton_rows(bible, skeleton_bible):
+                self._rows[bible.version] = None
+                continue
+            rows = array("i", [-1]) * len(skeleton_bible)
+            for i, (book, chapter, verse) in _iter_shared_references(bible, versification):
+                book_index = self.skeleton.books[book]
+                rows[book_index.bible_book.start + book_index.locate(chapter, verse)] = i
+            self._rows[bible.version] = rows
+            logger.info("Mapped the versification of %s to the shared skeleton", bible.version)
+
+    @staticmethod
+    def _has_skeleton_rows(bible: CompactBible, skeleton_bible: CompactBible) -> bool:
+        return (
+            [(bb.book, bb.start, bb.end) for bb in bible.books]
+            == [(bb.book, bb.start, bb.end) for bb in skeleton_bible.books]
+            and memoryview(bible.chapter_numbers) == memoryview(skeleton_bible.chapter_numbers)
+            and memoryview(bible.verse_numbers) == memoryview(skeleton_bible.verse_numbers))
+
+    @property
+    def versions(self) -> list[str]:
+        return list(self.bibles.keys())
+
+    def get_index(self, version: str) -> BibleIndex:
+        """
+        Return the BibleIndex of a version, sharing the offsets of the skeleton's books.
+        """
+        assert version in self.bibles, "Invalid version. Valid versions are: " + ", ".join(self.versions)
+        return BibleIndex(self.bibles[version], structure=self.skeleton)
+
+    def get_verses(
+            self, book: str,
+            from_chapter: int, from_verse: int,
+            to_chapter: int, to_verse: int,
+            versions: list[str] | None = None) -> list[ParallelBibleVerse]:
+        """
+        Return the verses from (from_chapter, from_verse) to (to_chapter, to_verse), inclusive,
+        in the shared versification, with their text in every version of versions (all by default).
+        """
+        versions = versions or self.versions
+        for version in versions:
+            assert version in self.bibles, "Invalid version. Valid versions are: " + ", ".join(self.versions)
+        book_index = self.skeleton.get_book(book)
+        i_from = book_index.locate(from_chapter, from_verse)
+        i_to = book_index.locate(to_chapter, to_verse)
+        assert i_from <= i_to, "Invalid verse range: 'from' is after 'to'"
+        start = book_index.bible_book.start
+
+        skeleton_bible = book_index.bible_book.bible
+        parallel_verses = [
+            ParallelBibleVerse(
+                chapter=skeleton_bible.chapter_numbers[i],
+                verse=skeleton_bible.verse_numbers[i],
+                texts={})
+            for i in range(start + i_from, start + i_to + 1)]
+        for version in versions:
+            bible = self.bibles[version]
+            rows = self._rows[version]
+            version_rows = (
+                range(start + i_from, start + i_to + 1) if rows is None
+                else rows[start + i_from:start + i_to + 1])
+            for parallel_verse, row in zip(parallel_verses, version_rows):
+                parallel_verse.texts[version] = bible.get_verse(row).text if row >= 0 else None
+        return parallel_verses
@@ -0,0 +1,222 @@
+import re
+from typing import NamedTuple
+
+from .definitions import BIBLE_BOOKS, BIBLE_BOOKS_CUVS, TextChunk
+from .indexes import BibleIndex
+from .utils import make_bible_quote, to_simplified
+
+
+# Standard abbreviations of the Chinese Union Version
+CUVS_ABBREVIATIONS = {
+    "genesis": "创", "exodus": "出", "leviticus": "利", "numbers": "民", "deuteronomy": "申",
+    "joshua": "书", "judges": "士", "ruth": "得", "1samuel": "撒上", "2samuel": "撒下",
+    "1kings": "王上", "2kings": "王下", "1chronicles": "代上", "2chronicles": "代下",
+    "ezra": "拉", "nehemiah": "尼", "esther": "斯", "job": "伯", "psalms": "诗",
+    "proverbs": "箴", "ecclesiastes": "传", "songs": "歌", "isaiah": "赛", "jeremiah": "耶",
+    "lamentations": "哀", "ezekiel": "结", "daniel": "但", "hosea": "何", "joel": "珥",
+    "amos": "摩", "obadiah": "俄", "jonah": "拿", "micah": "弥", "nahum": "鸿",
+    "habakkuk": "哈", "zephaniah": "番", "haggai": "该", "zechariah": "亚", "malachi": "玛",
+    "matthew": "太", "mark": "可", "luke": "路", "john": "约", "acts": "徒", "romans": "罗",
+    "1corinthians": "林前", "2corinthians": "林后", "galatians": "加", "ephesians": "弗",
+    "philippians": "腓", "colossians": "西", "1thessalonians": "帖前", "2thessalonians": "帖后",
+    "1timothy": "提前", "2timothy": "提后", "titus": "多", "philemon": "门", "hebrews": "来",
+    "james": "雅", "1peter": "彼前", "2peter": "彼后", "1john": "约一", "2john": "约二",
+    "3john": "约三", "jude": "犹", "revelation": "启",
+}
+
+# Other common names
+EXTRA_ALIASES = {
+    "genesis": ["创世记"],
+    "1kings": ["列王纪上"],
+    "2kings": ["列王纪下"],
+    "psalms": ["psalm"],
+    "songs": ["song of songs", "song of solomon", "雅歌书"],
+    "revelation": ["revelations"],
+}
+
+# English names that are also common words or given names, e.g. "Mark 3 points";
+# they need a verse to be read as references
+AMBIGUOUS_ENGLISH_NAMES = {
+    "mark", "acts", "numbers", "job", "judges", "ruth", "james", "john", "jude",
+    "daniel", "luke", "joel", "amos", "titus",
+}
+
+# Everyday words ending with a Chinese abbreviation, e.g. the 书 of 本书 or the 来 of 接下来;
+# an abbreviation at the end of one of them is not read as a reference
+COMMON_WORDS_ENDING_WITH_ABBREVIATIONS = {
+    "书": ["本书", "这书", "那书", "该书", "此书", "全书", "读书", "图书", "新书", "丛书", "说明书", "教科书"],
+    "来": ["接下来", "将来", "未来", "后来", "原来", "本来", "以来", "近来", "从来", "看来",
+          "出来", "起来", "下来", "过来", "回来", "进来", "上来"],
+    "约": ["大约", "相约", "合约", "条约", "契约", "节约", "预约"],
+    "诗": ["唐诗", "古诗", "写诗", "作诗", "新诗", "情诗"],
+    "出": ["演出", "支出", "输出", "推出", "提出", "指出", "付出", "退出"],
+    "可": ["不可", "宁可", "许可", "认可"],
+    "路": ["道路", "一路", "马路", "思路", "网路"],
+}
+
+# Traditional characters of the book names, so that references match without OpenCC
+_TRADITIONAL_BOOK_CHARS = str.maketrans(
+    "約記紀書詩傳賽結彌鴻該亞瑪羅馬後門來啟猶創歷數師節錄",
+    "约记纪书诗传赛结弥鸿该亚玛罗马后门来启犹创历数师节录")
+
+_NUMBER = r"(?:\d+|[零〇一二两三四五六七八九十百]+)"
+_CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+                   "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+class ScriptureReference(NamedTuple):
+    """
+    A reference found in a text. from_verse is None for whole chapters.
+    """
+    book: str
+    from_chapter: int
+    from_verse: int | None
+    to_chapter: int
+    to_verse: int | None
+    text: str
+
+
+def _alias_pattern(alias: str) -> str:
+    # "1john" also matches "1 john", and spaces match any whitespace
+    pattern = re.escape(alias).replace(r"\ ", r"\s+")
+    return re.sub(r"^(\d)", r"\1\\s*", pattern)
+
+
+def _build_alias_index() -> dict[str, str]:
+    """
+    Map every alias (lowercase, simplified) to its book key.
+    """
+    aliases: dict[str, str] = {}
+    for book in BIBLE_BOOKS:
+        aliases[book] = book
+        aliases[BIBLE_BOOKS_CUVS[book]] = book
+        aliases[CUVS_ABBREVIATIONS[book]] = book
+        for alias in EXTRA_ALIASES.get(book, []):
+            aliases[alias] = book
+    # English abbreviations: the first three letters (with the number) when they are unambiguous
+    prefixes: dict[str, list[str]] = {}
+    for book in BIBLE_BOOKS:
+        prefixes.setdefault(book[:4] if book[0].isdigit() else book[:3], []).append(book)
+    for prefix, books in prefixes.items():
+        if len(books) == 1 and prefix not in aliases:
+            aliases[prefix] = books[0]
+    return aliases
+
+ALIAS_INDEX = _build_alias_index()
+
+# Longer aliases first, so that 约翰福音 is not read as 约 (John) followed by text
+_REFERENCE_PATTERN = re.compile(
+    r"(?<![A-Za-z])(?P<book>"
+    + "|".join(_alias_pattern(alias) for alias in sorted(ALIAS_INDEX, key=len, reverse=True))
+    + r")\s*"
+    rf"(?:第\s*)?(?P<from_chapter>{_NUMBER})\s*"
+    rf"(?:(?:[:：]|章\s*(?:第\s*)?)(?P<from_verse>{_NUMBER})\s*节?)?"
+    r"(?:\s*[-–—~～至到]\s*"
+    rf"(?:(?P<to_chapter>{_NUMBER})\s*(?:[:：]|章\s*(?:第\s*)?))?"
+    rf"(?P<to_verse>{_NUMBER})\s*节?)?"
+    r"(?P<more>(?:\s*[,，、]\s*(?:\d+\s*[:：]\s*)?\d+(?:\s*[-–—~～]\s*\d+)?)*)"
+    r"(?P<unit>\s*[章篇])?",
+    re.IGNORECASE)
+
+# One item of a list of verses after a reference, e.g. the ",29" of "罗8:28,29"
+_LIST_ITEM_PATTERN = re.compile(
+    r"[,，、]\s*(?:(?P<chapter>\d+)\s*[:：]\s*)?(?P<from_verse>\d+)(?:\s*[-–—~～]\s*(?P<to_verse>\d+))?")
+
+
+def _parse_number(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+    total = 0
+    current = 0
+    for char in text:
+        if char == "十":
+            total += (current or 1) * 10
+            current = 0
+        elif char == "百":
+            total += (current or 1) * 100
+            current = 0
+        else:
+            current = _CHINESE_DIGITS[char]
+    return total + current
+
+
+def parse_references(text: str) -> list[ScriptureReference]:
+    """
+    Find the scripture references in a text, e.g. "约3:16", "罗马书 8:28-39", "诗篇23篇"
+    or "1 John 1:9". Book names can be Chinese full names or abbreviations, simplified
+    or traditional, or English names and abbreviations.
+    Lists of verses, e.g. "罗8:28,29" or "约3:16、18-20", give one reference per item.
+    So that ordinary words followed by a number are not read as references:
+    - Abbreviations of up to three characters need a verse or a 章/篇 suffix.
+    - Chinese abbreviations ending an everyday word, e.g. the 书 of 本书, are skipped.
+    - English names that are also common words, e.g. "Mark", need a verse.
+    """
+    references = []
+    normalized = to_simplified(text).translate(_TRADITIONAL_BOOK_CHARS)
+    for match in _REFERENCE_PATTERN.finditer(normalized):
+        alias = re.sub(r"\s+", " ", match["book"].lower())
+        book = ALIAS_INDEX.get(alias) or ALIAS_INDEX.get(alias.replace(" ", ""))
+        if book is None:
+            continue
+        if match["from_verse"] is None and (
+                (len(alias) <= 3 and match["unit"] is None)
+                or alias in AMBIGUOUS_ENGLISH_NAMES):
+            continue
+        if any(normalized[:match.end("book")].endswith(word)
+               for word in COMMON_WORDS_ENDING_WITH_ABBREVIATIONS.get(alias, [])):
+            continue
+
+        from_chapter = _parse_number(match["from_chapter"])
+        from_verse = _parse_number(match["from_verse"]) if match["from_verse"] else None
+        to_chapter = _parse_number(match["to_chapter"]) if match["to_chapter"] else from_chapter
+        to_verse = _parse_number(match["to_verse"]) if match["to_verse"] else None
+        if from_verse is None and to_verse is not None and match["to_chapter"] is None:
+            # A range of whole chapters, e.g. 诗篇23-24篇
+            to_chapter, to_verse = to_verse, None
+        elif from_verse is not None and to_verse is None:
+            to_verse = from_verse
+        references.append(ScriptureReference(
+            book=book,
+            from_chapter=from_chapter, from_verse=from_verse,
+            to_chapter=to_chapter, to_verse=to_verse,
+            text=match.group(0).strip()))
+        if from_verse is None:
+            continue
+        # Verses listed after the reference are in its last chapter, unless they name one
+        chapter = to_chapter
+        for item in _LIST_ITEM_PATTERN.finditer(match["more"]):
+            chapter = int(item["chapter"]) if item["chapter"] else chapter
+            references.append(ScriptureReference(
+                book=book,
+                from_chapter=chapter, from_verse=int(item["from_verse"]),
+                to_chapter=chapter, to_verse=int(item["to_verse"] or item["from_verse"]),
+                text=match.group(0).strip()))
+    return references
+
+
+def resolve_reference(
+        bible_index: BibleIndex, reference: ScriptureReference,
+        max_verses: int | None = None) -> TextChunk:
+    """
+    Return the quote of a reference, keeping its first max_verses verses.
+    """
+    book_index = bible_index.get_book(reference.book)
+    from_verse = reference.from_verse
+    to_verse = reference.to_verse
+    if from_verse is None:
+        from_verse = min(book_index.offsets.get(reference.from_chapter, {0: 0}))
+    if to_verse is None:
+        to_verse = max(book_index.offsets.get(reference.to_chapter, {0: 0}))
+    verses = book_index.get_verses(
+        reference.from_chapter, from_verse, reference.to_chapter, to_verse)
+    if max_verses is not None:
+        verses = verses[:max_verses]
+    return make_bible_quote(book=reference.book, verses=verses)
+
+
+def format_reference_quotes(quotes: list[dict]) -> str:
+    """
+    Format resolved quotes (TextChunk dicts) as context for the agents.
+    """
+    return "使用者請求中引用的經文：\n" + "\n".join(
+        f"{quote['metadata']['range']}: {quote['text']}" for quote in quotes)
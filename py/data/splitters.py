@@ -1,10 +1,12 @@
 from abc import ABC
-from typing import List
+from collections import deque
+from typing import Iterator, List
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from .compact import CompactBibleBook
 from .definitions import BibleBook, TextChunk
-from .utils import extract_verses_text, make_bible_quote
+from .utils import make_bible_quote
 
 
 class AbstractSplitter(ABC):
@@ -30,25 +32,40 @@ class ByLengthSplitter(AbstractSplitter):
             is_separator_regex=False)
 
 
-def split_bible_book(
-        bible_book: BibleBook,
-        chunk_size: int =400, overlap: int = 30) -> list[TextChunk]:
-    chunks = []
-    verse_cache = []
+def iter_bible_book_chunks(
+        bible_book: BibleBook | CompactBibleBook,
+        chunk_size: int = 400, overlap: int = 30) -> Iterator[TextChunk]:
+    """
+    Yield the chunks of a Bible book: runs of whole verses joined by spaces, up to
+    chunk_size characters, where each chunk starts with the trailing verses of the
+    previous one, totalling at most overlap characters.
+    The window keeps a running count of its text length, so each verse is visited
+    a constant number of times.
+    """
+    window: deque = deque()
+    # Length of the window verses without the joining spaces
+    window_length = 0
     for verse in bible_book.verses:
-        cached_text = extract_verses_text(verse_cache)
-        proposed_chunk_text = cached_text + verse.text
-        if len(proposed_chunk_text) > chunk_size and verse_cache:
+        # The joined window text has len(window) - 1 spaces
+        cached_length = window_length + len(window) - 1 if window else 0
+        if cached_length + len(verse.text) > chunk_size and window:
             bible_quote = make_bible_quote(
-                book=bible_book.book, verses=verse_cache)
+                book=bible_book.book, verses=list(window))
             bible_quote.metadata["category"] = "bible"
-            chunks.append(bible_quote)
-            while len(verse_cache) > 0 and len(extract_verses_text(verse_cache)) > overlap:
-                verse_cache.pop(0)
-        verse_cache.append(verse)
-    if verse_cache:
+            yield bible_quote
+            while window and window_length + len(window) - 1 > overlap:
+                window_length -= len(window.popleft().text)
+        window.append(verse)
+        window_length += len(verse.text)
+    if window:
         bible_quote = make_bible_quote(
-            book=bible_book.book, verses=verse_cache)
+            book=bible_book.book, verses=list(window))
         bible_quote.metadata["category"] = "bible"
-        chunks.append(bible_quote)
-    return chunks
+        yield bible_quote
+
+
+def split_bible_book(
+        bible_book: BibleBook | CompactBibleBook,
+        chunk_size: int = 400, overlap: int = 30) -> list[TextChunk]:
+    return list(iter_bible_book_chunks(
+        bible_book, chunk_size=chunk_size, overlap=overlap))
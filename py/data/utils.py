@@ -1,21 +1,45 @@
 
+import re
+
+from .compact import CompactBibleVerse
 from .definitions import BibleVerse, TextChunk
 
+# Optional Traditional -> Simplified Chinese conversion, so traditional queries can
+# match the (simplified) CUVS text lexically
+try:
+    from opencc import OpenCC
+    _to_simplified_converter = OpenCC("t2s")
+except ImportError:
+    _to_simplified_converter = None
+
+# Function words that carry no lexical signal on their own
+CHINESE_STOP_CHARS = set("的了吗呢吧啊是在和与及之于也就都而么什怎为何哪谁麼為與於誰嗎")
+
+# Question words and fillers of search queries, e.g. the 为什么 of "...喜乐吗？为什么？",
+# in simplified and traditional characters since OpenCC is optional
+QUERY_FUNCTION_WORDS = [
+    "为什么", "為什麼", "什么", "什麼", "怎么样", "怎麼樣", "怎么", "怎麼", "怎样", "怎樣",
+    "如何", "是否", "有没有", "有沒有", "请问", "請問", "关于", "關於", "圣经", "聖經",
+    "我们", "我們", "你们", "你們", "他们", "他們", "吗", "嗎", "呢", "吧",
+]
+_QUERY_SEPARATOR_PATTERN = re.compile(
+    r"[\W_]+|" + "|".join(re.escape(word) for word in sorted(QUERY_FUNCTION_WORDS, key=len, reverse=True)))
+
 
 def _to_bible_verses(
-        verses: list[dict]) -> list[BibleVerse]:
-    assert all(isinstance(v, dict) or isinstance(v, BibleVerse)
+        verses: list[dict]) -> list[BibleVerse | CompactBibleVerse]:
+    assert all(isinstance(v, (dict, BibleVerse, CompactBibleVerse))
                for v in verses)
     verses = [
-        v if isinstance(v, BibleVerse) else BibleVerse(**v)
+        v if isinstance(v, (BibleVerse, CompactBibleVerse)) else BibleVerse(**v)
         for v in verses]
     return verses
 
 
 def encode_verse_range(
         book: str,
-        from_verse: BibleVerse,
-        to_verse: BibleVerse | None) -> str:
+        from_verse: BibleVerse | CompactBibleVerse,
+        to_verse: BibleVerse | CompactBibleVerse | None) -> str:
     """
     Given a from verse and an optional to verse, create the string that represents the range
     """
@@ -37,13 +61,13 @@ def encode_verse_range(
 
 def extract_verses_text(
         verses: list[dict]) -> str:
-    verses: list[BibleVerse] = _to_bible_verses(verses)
+    verses: list[BibleVerse | CompactBibleVerse] = _to_bible_verses(verses)
     return " ".join(v.text for v in verses)
 
 
 def make_bible_quote(
         book: str, verses: list[dict]) -> TextChunk:
-    verses: list[BibleVerse] = _to_bible_verses(verses)
+    verses: list[BibleVerse | CompactBibleVerse] = _to_bible_verses(verses)
     return TextChunk(
         text=extract_verses_text(verses),
         metadata={
@@ -51,3 +75,41 @@ def make_bible_quote(
                 book=book, from_verse=verses[0], to_verse=verses[-1])
         }
     )
+
+
+def to_simplified(text: str) -> str:
+    """
+    Convert Traditional Chinese to Simplified Chinese when OpenCC is installed.
+    """
+    if _to_simplified_converter is None:
+        return text
+    return _to_simplified_converter.convert(text)
+
+
+def char_ngrams(text: str, ns: tuple[int, ...] = (1, 2)) -> list[str]:
+    """
+    Tokenize text into character n-grams for lexical matching of Chinese text.
+    Punctuation and whitespace are dropped, and so are stop-character unigrams.
+    """
+    chars = re.sub(r"[\W_]+", "", to_simplified(text).lower())
+    ngrams = []
+    for n in ns:
+        for i in range(len(chars) - n + 1):
+            ngram = chars[i:i + n]
+            if n == 1 and ngram in CHINESE_STOP_CHARS:
+                continue
+            ngrams.append(ngram)
+    return ngrams
+
+
+def query_terms(query: str, n: int) -> set[str]:
+    """
+    Return the distinct content n-grams of a search query: n-grams do not span punctuation
+    or question words (e.g. no 吗为 in "喜乐吗？为什么？"), and none contains a stop character.
+    """
+    terms = set()
+    for segment in _QUERY_SEPARATOR_PATTERN.split(to_simplified(query).lower()):
+        terms.update(
+            ngram for ngram in char_ngrams(segment, ns=(n,))
+            if not CHINESE_STOP_CHARS.intersection(ngram))
+    return terms
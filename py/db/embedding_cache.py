@@ -0,0 +1,112 @@
+from array import array
+import hashlib
+import logging
+from pathlib import Path
+import re
+import sqlite3
+import threading
+from typing import Callable
+import unicodedata
+
+from cache import LRUCache
+
+
+logger = logging.getLogger("embedding_cache")
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Normalize a query so trivially different spellings share a cache entry.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed on the model name and the normalized query:
+    an in-process LRU tier and an optional SQLite tier that survives restarts.
+    """
+
+    def __init__(
+            self, model_name: str,
+            max_entries: int = 4096,
+            sqlite_path: str | Path | None = None):
+        self.model_name = model_name
+        self._memory = LRUCache(maxsize=max_entries)
+        self.disk_hits = 0
+        self._vector_bytes = 0
+
+        self.sqlite_path = Path(sqlite_path) if sqlite_path else None
+        self._db = None
+        self._db_lock = threading.Lock()
+        if self.sqlite_path is not None:
+            self.sqlite_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.model_name}\0{normalize_query_text(text)}".encode("utf-8")).hexdigest()
+
+    def _get_from_disk(self, key: str) -> array | None:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.disk_hits += 1
+        self._vector_bytes = len(row[0])
+        return array("f", row[0])
+
+    def _put_to_disk(self, key: str, vector: array) -> None:
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                (key, self.model_name, vector.tobytes()))
+            self._db.commit()
+
+    def get(self, text: str) -> list[float] | None:
+        key = self._key(text)
+        vector = self._memory.get(key)
+        if vector is None:
+            vector = self._get_from_disk(key)
+            if vector is None:
+                return None
+            self._memory.put(key, vector)
+        return vector.tolist()
+
+    def put(self, text: str, vector: list[float]) -> None:
+        key = self._key(text)
+        # Store float32 arrays rather than lists of Python floats
+        packed = array("f", vector)
+        self._vector_bytes = len(packed) * packed.itemsize
+        self._memory.put(key, packed)
+        self._put_to_disk(key, packed)
+
+    def get_or_embed(self, text: str, embed: Callable[[str], list[float]]) -> list[float]:
+        vector = self.get(text)
+        if vector is None:
+            vector = embed(text)
+            self.put(text, vector)
+        return vector
+
+    def stats(self) -> dict:
+        memory_stats = self._memory.stats()
+        lookups = memory_stats["hits"] + memory_stats["misses"]
+        hits = memory_stats["hits"] + self.disk_hits
+        return {
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_hits": memory_stats["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": lookups - hits,
+            "memory_entries": memory_stats["size"],
+            "memory_bytes": memory_stats["size"] * self._vector_bytes,
+            "disk_bytes": self.sqlite_path.stat().st_size if self.sqlite_path and self.sqlite_path.is_file() else 0,
+        }
@@ -0,0 +1,218 @@
+import json
+import logging
+from pathlib import Path
+import threading
+
+import numpy as np
+
+
+logger = logging.getLogger("local_store")
+
+VECTORS_FILE = "vectors.npy"
+POINTS_FILE = "points.jsonl"
+LOCAL_INDEXES = ["brute", "hnsw"]
+
+
+class LocalVectorStore:
+    """
+    An in-process vector store: a memory-mapped float32 matrix of unit-normalized
+    vectors (vectors.npy) and one JSON line per point (points.jsonl).
+    Searches are a vectorized cosine top-k, or an approximate HNSW query when
+    index is "hnsw" (requires hnswlib).
+    Writes stay in memory, in a matrix grown geometrically, until flush() persists them.
+    """
+
+    def __init__(self, directory: Path, dimension: int, index: str = "brute"):
+        assert index in LOCAL_INDEXES, f"Invalid {index = }"
+        self.directory = directory
+        self.dimension = dimension
+        self.index = index
+        self._lock = threading.Lock()
+        self._hnsw_index = None
+        self._columns: dict[str, np.ndarray] = {}
+        self._dirty = False
+
+        vectors_path = directory / VECTORS_FILE
+        points_path = directory / POINTS_FILE
+        if vectors_path.is_file() and points_path.is_file():
+            self._matrix = np.load(vectors_path, mmap_mode="r")
+            with open(points_path, "r", encoding="utf-8") as f:
+                points = [json.loads(line) for line in f]
+            self.ids = [p["id"] for p in points]
+            self.payloads = [p["payload"] for p in points]
+            assert self._matrix.shape == (len(self.ids), dimension), "vectors.npy does not match points.jsonl"
+            logger.info("Loaded %d points from %s", len(self.ids), directory)
+        else:
+            self._matrix = np.zeros((0, dimension), dtype=np.float32)
+            self.ids = []
+            self.payloads = []
+        self._positions = {point_id: i for i, point_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._matrix[:len(self.ids)]
+
+    def _reserve(self, n_rows: int) -> np.ndarray:
+        """
+        Return the vector matrix, writable and with room for n_rows rows. The matrix is
+        copied out of the mmap on the first write and doubled when full, so that
+        appending is amortized O(1) per row.
+        """
+        if not self._matrix.flags.writeable or len(self._matrix) < n_rows:
+            capacity = max(n_rows, 2 * len(self._matrix), 1024)
+            matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+            matrix[:len(self.ids)] = self._matrix[:len(self.ids)]
+            self._matrix = matrix
+        return self._matrix
+
+    def _invalidate(self) -> None:
+        self._hnsw_index = None
+        self._columns = {}
+
+    def save(self) -> None:
+        """
+        Atomically rewrite the store files. Prefer flush(), which skips an unchanged store.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_vectors_path = self.directory / (VECTORS_FILE + ".tmp.npy")
+        tmp_points_path = self.directory / (POINTS_FILE + ".tmp")
+        np.save(tmp_vectors_path, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(tmp_points_path, "w", encoding="utf-8") as f:
+            for point_id, payload in zip(self.ids, self.payloads):
+                f.write(json.dumps({"id": point_id, "payload": payload}, ensure_ascii=False) + "\n")
+        tmp_vectors_path.replace(self.directory / VECTORS_FILE)
+        tmp_points_path.replace(self.directory / POINTS_FILE)
+
+    def flush(self) -> None:
+        """
+        Persist the writes since the last flush, if any.
+        """
+        with self._lock:
+            if self._dirty:
+                self.save()
+                self._dirty = False
+                logger.info("Saved %d points to %s", len(self.ids), self.directory)
+
+    def retrieve(self, ids: list[str]) -> dict[str, dict]:
+        # Copies, so that callers cannot change the stored payloads
+        with self._lock:
+            return {
+                point_id: dict(self.payloads[self._positions[point_id]])
+                for point_id in ids if point_id in self._positions}
+
+    def upsert(self, ids: list[str], vectors: list[list[float]], payloads: list[dict]) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+        with self._lock:
+            n_new = len(set(ids) - self._positions.keys())
+            vectors = self._reserve(len(self.ids) + n_new)
+            for point_id, row, payload in zip(ids, matrix, payloads):
+                if point_id in self._positions:
+                    self.payloads[self._positions[point_id]] = dict(payload)
+                else:
+                    self._positions[point_id] = len(self.ids)
+                    self.ids.append(point_id)
+                    self.payloads.append(dict(payload))
+                vectors[self._positions[point_id]] = row
+            self._dirty = True
+            self._invalidate()
+
+    def set_payloads(self, payloads: dict[str, dict]) -> None:
+        with self._lock:
+            for point_id, payload in payloads.items():
+                self.payloads[self._positions[point_id]] = dict(payload)
+            self._dirty = True
+            self._invalidate()
+
+    def delete_where_not(self, key: str, value, filters: dict | None = None) -> int:
+        """
+        Delete every point matching filters (all points by default) whose payload[key] is not value.
+        A list in filters matches any of its values, None matching a missing key.
+        Returns the number of deleted points.
+        """
+        def matches(payload: dict, k: str, v) -> bool:
+            return payload.get(k) in v if isinstance(v, list) else payload.get(k) == v
+
+        with self._lock:
+            filters = filters or {}
+            kept = [
+                i for i, payload in enumerate(self.payloads)
+                if payload.get(key) == value or not all(matches(payload, k, v) for k, v in filters.items())]
+            n_deleted = len(self.ids) - len(kept)
+            self._matrix = np.array(self.vectors[kept], dtype=np.float32)
+            self.ids = [self.ids[i] for i in kept]
+            self.payloads = [self.payloads[i] for i in kept]
+            self._positions = {point_id: i for i, point_id in enumerate(self.ids)}
+            self._dirty = self._dirty or n_deleted > 0
+            self._invalidate()
+        return n_deleted
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            column = np.array([payload.get(key) for payload in self.payloads], dtype=object)
+            self._columns[key] = column
+        return column
+
+    def _filter_mask(self, filters: dict | None) -> np.ndarray | None:
+        if not filters:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, value in filters.items():
+            mask &= self._column(key) == value
+        return mask
+
+    def _get_hnsw_index(self):
+        if self._hnsw_index is None:
+            import hnswlib
+            hnsw_index = hnswlib.Index(space="ip", dim=self.dimension)
+            hnsw_index.init_index(max_elements=max(1, len(self.ids)), ef_construction=200, M=16)
+            if len(self.ids) > 0:
+                hnsw_index.add_items(np.asarray(self.vectors), np.arange(len(self.ids)))
+            self._hnsw_index = hnsw_index
+        return self._hnsw_index
+
+    def _search_brute(self, query: np.ndarray, top_k: int, mask: np.ndarray | None) -> list[int]:
+        if mask is None:
+            candidates = np.arange(len(self.ids))
+            scores = self.vectors @ query
+        else:
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            scores = self.vectors[candidates] @ query
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top].tolist()
+
+    def _search_hnsw(self, query: np.ndarray, top_k: int, mask: np.ndarray | None) -> list[int]:
+        hnsw_index = self._get_hnsw_index()
+        # Over-fetch when filtering, then fall back to the exact search if too few points pass
+        k = min(len(self.ids), top_k if mask is None else top_k * 10)
+        hnsw_index.set_ef(max(50, k))
+        labels, _ = hnsw_index.knn_query(query, k=k)
+        positions = [int(p) for p in labels[0] if mask is None or mask[p]]
+        if len(positions) < top_k and mask is not None and mask.sum() > len(positions):
+            return self._search_brute(query, top_k, mask)
+        return positions[:top_k]
+
+    def search(self, vector: list[float], top_k: int = 30, filters: dict | None = None) -> list[dict]:
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm > 0:
+            query = query / query_norm
+        with self._lock:
+            if len(self.ids) == 0:
+                return []
+            mask = self._filter_mask(filters)
+            if self.index == "hnsw":
+                positions = self._search_hnsw(query, top_k, mask)
+            else:
+                positions = self._search_brute(query, top_k, mask)
+            # Copies, so that callers cannot change the stored payloads
+            return [dict(self.payloads[p]) for p in positions]
@@ -1,4 +1,6 @@
+import hashlib
 import logging
+from pathlib import Path
 import uuid
 import os
 
@@ -6,27 +8,60 @@ from qdrant_client import QdrantClient, models, grpc
 
 from data.definitions import TextChunk
 from config import config, embedding_length, embedding_model
+from db.embedding_cache import EmbeddingCache
+from db.local_store import LocalVectorStore
+from metrics import registry, timed
 
 
 logger = logging.getLogger("vector_store")
 
 vs_config = config["vector_store"]
-vs_url = vs_config['client_args']['url']
-vs_api_key = os.environ[vs_config['client_args']['token_var']]
+vs_provider = vs_config.get("provider", "qdrant")
+assert vs_provider in ["qdrant", "local"], f"Invalid vector store provider: {vs_provider}"
 vs_collection_name = vs_config["collection_name"]
 
 # --- Global instances (initialized once for efficiency) ---
-# Initialize the Qdrant client.
-qdrant_client = QdrantClient(
-    url=vs_url,
-    api_key=vs_api_key,
-    https=vs_url.startswith("https://"),)
+# Initialize the Qdrant client, or the in-process store for the "local" provider.
+qdrant_client: QdrantClient | None = None
+local_store: LocalVectorStore | None = None
+if vs_provider == "qdrant":
+    vs_url = vs_config['client_args']['url']
+    vs_api_key = os.environ[vs_config['client_args']['token_var']]
+    qdrant_client = QdrantClient(
+        url=vs_url,
+        api_key=vs_api_key,
+        https=vs_url.startswith("https://"),)
+else:
+    local_store = LocalVectorStore(
+        directory=Path(vs_config["local"]["directory"]) / vs_collection_name,
+        dimension=embedding_length,
+        index=vs_config["local"].get("index", "brute"))
+
+# Cache of the query embeddings
+embedding_cache_config = config["embedding"].get("cache", {})
+embedding_cache = EmbeddingCache(
+    model_name=config["embedding"]["openai_model"],
+    max_entries=embedding_cache_config.get("max_entries", 4096),
+    sqlite_path=embedding_cache_config.get("sqlite_path"))
+
+registry.gauge(
+    "bsb_embedding_cache_hit_ratio", "Hit ratio of the query embedding cache",
+    lambda: embedding_cache.stats()["hit_rate"])
+registry.gauge(
+    "bsb_embedding_cache_bytes", "Bytes used by the query embedding cache (memory and disk)",
+    lambda: embedding_cache.stats()["memory_bytes"] + embedding_cache.stats()["disk_bytes"])
+
+# Namespace of the deterministic point IDs
+TEXT_CHUNK_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "bible-study-bot/text-chunk")
 
 
 def create_collection_if_not_exists() -> None:
     """
-    Creates the Qdrant collection if it does not already exist.
+    Creates the Qdrant collection if it does not already exist (no-op for the local store).
     """
+    if local_store is not None:
+        # The local store files are created on the first upsert
+        return
     try:
         collection_response: grpc.GetCollectionInfoResponse = qdrant_client.get_collection(collection_name=vs_collection_name)
         collection_status = str(collection_response.status).lower()
@@ -50,25 +85,144 @@ def create_collection_if_not_exists() -> None:
     logger.info("Collection '%s' created successfully.", vs_collection_name)
 
 
+def text_chunk_hash(text_chunk: TextChunk) -> str:
+    return hashlib.sha256(text_chunk.text.encode("utf-8")).hexdigest()
+
+
+def text_chunk_point_id(text_chunk: TextChunk) -> str:
+    """
+    Derive a deterministic point ID from the chunk's version, range and text hash,
+    so publishing the same chunk twice updates one point instead of duplicating it.
+    """
+    key = "|".join([
+        str(text_chunk.metadata.get("version", "")),
+        str(text_chunk.metadata.get("range", "")),
+        text_chunk_hash(text_chunk)])
+    return str(uuid.uuid5(TEXT_CHUNK_ID_NAMESPACE, key))
+
+
+def _retrieve_text_hashes(point_ids: list[str]) -> dict[str, str | None]:
+    """
+    Return the stored text hash of each point that already exists.
+    """
+    if local_store is not None:
+        return {
+            point_id: payload.get("text_hash")
+            for point_id, payload in local_store.retrieve(point_ids).items()}
+    existing_records = qdrant_client.retrieve(
+        collection_name=vs_collection_name,
+        ids=point_ids,
+        with_payload=["text_hash"], with_vectors=False)
+    return {
+        str(record.id): (record.payload or {}).get("text_hash")
+        for record in existing_records}
+
+
 def add_text_chunk(text_chunk: TextChunk) -> None:
     """
     Generates an embedding for a TextChunk and upserts it with its metadata
-    into the Qdrant collection.
+    into the vector store.
     """
-    vector = embedding_model.embed_documents([text_chunk.text])[0]
-    payload = {"text": text_chunk.text, **text_chunk.metadata}
-    point_id = str(uuid.uuid4())
+    add_text_chunks([text_chunk])
 
-    qdrant_client.upsert(
+
+def add_text_chunks(text_chunks: list[TextChunk]) -> tuple[int, int]:
+    """
+    Generates the embeddings of a batch of TextChunks with one embedding request
+    and upserts them with their metadata into the vector store in one call.
+    Chunks already stored with the same text hash are not re-embedded; only their
+    metadata is refreshed.
+    Returns the numbers of chunks added and skipped.
+    """
+    if len(text_chunks) == 0:
+        return 0, 0
+    payloads = {
+        text_chunk_point_id(tc): {"text": tc.text, "text_hash": text_chunk_hash(tc), **tc.metadata}
+        for tc in text_chunks}
+
+    existing_hashes = _retrieve_text_hashes(list(payloads.keys()))
+    existing_ids = {
+        point_id for point_id, text_hash in existing_hashes.items()
+        if text_hash == payloads[point_id]["text_hash"]}
+    if existing_ids and local_store is not None:
+        local_store.set_payloads({point_id: payloads[point_id] for point_id in existing_ids})
+    elif existing_ids:
+        qdrant_client.batch_update_points(
+            collection_name=vs_collection_name,
+            update_operations=[
+                models.SetPayloadOperation(set_payload=models.SetPayload(
+                    payload=payloads[point_id], points=[point_id]))
+                for point_id in existing_ids],
+            wait=True,
+        )
+
+    new_ids = [point_id for point_id in payloads if point_id not in existing_ids]
+    if new_ids:
+        vectors = embedding_model.embed_documents([payloads[point_id]["text"] for point_id in new_ids])
+        assert len(vectors) == len(new_ids), "Embedding count does not match the chunk count"
+        if local_store is not None:
+            local_store.upsert(new_ids, vectors, [payloads[point_id] for point_id in new_ids])
+        else:
+            qdrant_client.upsert(
+                collection_name=vs_collection_name,
+                points=[
+                    models.PointStruct(id=point_id, vector=vector, payload=payloads[point_id])
+                    for point_id, vector in zip(new_ids, vectors)],
+                wait=True,
+            )
+    logger.info("Added %d chunks and skipped %d unchanged chunks in collection '%s'.",
+                len(new_ids), len(existing_ids), vs_collection_name)
+    return len(new_ids), len(existing_ids)
+
+
+def flush_text_chunks() -> None:
+    """
+    Persists the pending writes of the local store (a no-op for Qdrant, which persists every write).
+    """
+    if local_store is not None:
+        local_store.flush()
+
+
+def delete_text_chunks_from_other_builds(data_build: str, category: str, version: str | None = None) -> None:
+    """
+    Deletes, in bulk, the points of a category (and version) that were not published by
+    the data build data_build, including the legacy points published without a data build
+    or a version. The points of other categories and versions are kept.
+    """
+    if local_store is not None:
+        scope = {"category": category}
+        if version is not None:
+            scope["version"] = [version, None]
+        n_deleted = local_store.delete_where_not("data_build", data_build, filters=scope)
+        logger.info("Deleted %d points of %s from data builds other than %s from the local store.",
+                    n_deleted, scope, data_build)
+        return
+    conditions = [models.FieldCondition(key="category", match=models.MatchValue(value=category))]
+    if version is not None:
+        conditions.append(models.Filter(should=[
+            models.FieldCondition(key="version", match=models.MatchValue(value=version)),
+            models.IsEmptyCondition(is_empty=models.PayloadField(key="version"))]))
+    # A point without a data_build does not match the must_not condition, so it is deleted
+    qdrant_client.delete(
         collection_name=vs_collection_name,
-        points=[models.PointStruct(id=point_id, vector=vector, payload=payload)],
+        points_selector=models.FilterSelector(filter=models.Filter(
+            must=conditions,
+            must_not=[
+                models.FieldCondition(key="data_build", match=models.MatchValue(value=data_build))])),
         wait=True,
     )
-    logger.info("Successfully added chunk with id %s to Qdrant collection '%s'.", point_id, vs_collection_name)
+    logger.info("Deleted the points of %s (version %s) from data builds other than %s from Qdrant collection '%s'.",
+                category, version or "any", data_build, vs_collection_name)
 
 
 def search_text_chunks(text: str, top_k: int = 30, filters: dict | None = None) -> list[dict]:
-    vector = embedding_model.embed_documents([text])[0]
+    with timed("search_text_chunks_embed"):
+        vector = embedding_cache.get_or_embed(
+            text, lambda t: embedding_model.embed_documents([t])[0])
+
+    if local_store is not None:
+        with timed("search_text_chunks_query", provider="local"):
+            return local_store.search(vector, top_k=top_k, filters=filters)
 
     query_filter = None
     if filters:
@@ -78,12 +232,13 @@ def search_text_chunks(text: str, top_k: int = 30, filters: dict | None = None)
         ]
         query_filter = models.Filter(must=conditions)
 
-    search_results = qdrant_client.query_points(
-        collection_name=vs_collection_name,
-        query=vector,
-        query_filter=query_filter,
-        limit=top_k,
-        with_payload=True, with_vectors=False)
+    with timed("search_text_chunks_query", provider="qdrant"):
+        search_results = qdrant_client.query_points(
+            collection_name=vs_collection_name,
+            query=vector,
+            query_filter=query_filter,
+            limit=top_k,
+            with_payload=True, with_vectors=False)
     points_payload = [
         srel.payload
         for srel in search_results.points]
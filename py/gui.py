@@ -1,9 +1,16 @@
 import asyncio
+import queue
+import threading
+import time
+from typing import Iterator
 
 from langchain.messages import AIMessage
 import streamlit as st
 
-from agent import create_agent
+from agent import get_agent, invalidate_agent
+from config import config
+from metrics import registry, serve_metrics
+from sub_agents.generalist import FINAL_ANSWER_TAG
 
 # Page configuration
 st.set_page_config(
@@ -12,6 +19,62 @@ st.set_page_config(
     layout="wide")
 st.title("📖 Bible Study Bot")
 
+# The agent graph and MCP tools are cached by the process and shared by every session
+with st.sidebar:
+    if st.button("Reload agent tools", help="Fetch the MCP tools again and rebuild the agent graphs."):
+        invalidate_agent()
+
+
+@st.cache_resource
+def start_metrics_server() -> None:
+    """
+    Serve the metrics of the process (time to first token, plan routes, caches) once,
+    since the MCP server's /metrics only covers the MCP server process.
+    """
+    ui_port = config.get("metrics", {}).get("ui_port")
+    if ui_port is not None:
+        serve_metrics(ui_port)
+
+start_metrics_server()
+
+
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    One event loop, running in a background thread, for every chat of the process. The agent
+    nodes are async, so concurrent chats share it, together with the async HTTP client.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return loop
+
+
+_END_OF_EVENTS = object()
+
+def iter_agent_events(inputs: dict) -> Iterator[dict]:
+    """
+    Run the agent on the shared event loop and yield its astream_events() events
+    in the script thread, which is the only one allowed to update the page.
+    """
+    events = queue.Queue()
+
+    async def produce_events():
+        try:
+            agent = await get_agent()
+            async for event in agent.astream_events(inputs, version="v2"):
+                events.put(event)
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(_END_OF_EVENTS)
+
+    asyncio.run_coroutine_threadsafe(produce_events(), get_event_loop())
+    while (event := events.get()) is not _END_OF_EVENTS:
+        if isinstance(event, Exception):
+            raise event
+        yield event
+
+
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -32,31 +95,64 @@ if prompt := st.chat_input("Ask a question about the Bible..."):
         status_container = st.status("Thinking...", expanded=True)
         message_placeholder = st.empty()
 
-        async def stream_chat():
-            agent = await create_agent()
+        def stream_chat():
+            start_time = time.perf_counter()
             inputs = {"messages": st.session_state.messages}
             final_response = "(thinking...)"
+            # Tokens of the current generalist LLM call of every plan task (tasks can run concurrently);
+            # a new call of a task (e.g. after tool calls) starts its answer over
+            streamed_answers: dict[str, str] = {}
+            time_to_first_token = None
             
-            async for event in agent.astream_events(inputs, version="v2"):
+            for event in iter_agent_events(inputs):
                 event_type = event["event"]
                 
-                if event_type == "on_tool_start":
+                if (event_type == "on_chain_end" and event["name"] == "references"
+                        and isinstance(event["data"].get("output"), dict)
+                        and event["data"]["output"].get("references")):
+                    ranges = [quote["metadata"]["range"] for quote in event["data"]["output"]["references"]]
+                    status_container.write(f"**Scripture references:** {', '.join(ranges)}")
+                elif (event_type == "on_chain_end" and event["name"] == "planner"
+                        and isinstance(event["data"].get("output"), dict)
+                        and "plan" in event["data"]["output"]):
+                    plan = event["data"]["output"]["plan"]
+                    status_container.write(
+                        f"**Plan:** {len(plan.get('nodes', {}))} task(s), {plan.get('route', 'llm')} route")
+                elif event_type == "on_tool_start":
                     status_container.write(f"**Calling tool:** `{event['name']}`")
                 elif event_type == "on_tool_end":
                     status_container.write("**Tool output:**")
                     status_container.write(event["data"].get("output"))
+                elif event_type == "on_chat_model_start" and FINAL_ANSWER_TAG in event.get("tags", []):
+                    streamed_answers[event["metadata"].get("plan_node_id", "")] = ""
+                elif event_type == "on_chat_model_stream" and FINAL_ANSWER_TAG in event.get("tags", []):
+                    token = event["data"]["chunk"].content
+                    if isinstance(token, str) and token:
+                        if time_to_first_token is None:
+                            time_to_first_token = time.perf_counter() - start_time
+                            registry.histogram(
+                                "bsb_time_to_first_token_seconds",
+                                "Time from a user message to the first streamed answer token in seconds",
+                            ).observe(time_to_first_token)
+                            status_container.write(f"**Time to first token:** {time_to_first_token:.2f}s")
+                        plan_node_id = event["metadata"].get("plan_node_id", "")
+                        streamed_answers[plan_node_id] = streamed_answers.get(plan_node_id, "") + token
+                        message_placeholder.markdown("\n\n".join(streamed_answers.values()) + "▌")
                 elif (event_type == "on_chain_end" and "data" in event
                       and "output" in event["data"] and "messages" in event["data"]["output"]
                       and len(event["data"]["output"]["messages"]) > 0
                       and isinstance(event["data"]["output"]["messages"][-1], AIMessage)):
                     final_response = event["data"]["output"]["messages"][-1].content
             
+            if streamed_answers:
+                final_response = "\n\n".join(streamed_answers.values())
+            status_container.write(f"**Total time:** {time.perf_counter() - start_time:.2f}s")
             status_container.update(label="Finished thinking", state="complete", expanded=False)
             message_placeholder.markdown(final_response)
             return final_response
 
         try:
-            response_content = asyncio.run(stream_chat())
+            response_content = stream_chat()
             st.session_state.messages.append({"role": "assistant", "content": response_content})
         except Exception as e:
             st.error(f"An error occurred: {e}")
\ No newline at end of file
@@ -2,13 +2,23 @@ import logging
 from pathlib import Path
 
 import fastmcp
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 
 from config import config
-from data.definitions import BibleBook
-from data.utils import make_bible_quote
-from data.loaders import load_bible_from_dir
+from data.compact import CompactBible
+from data.definitions import BibleVerseRange
+from data.indexes import CONTEXT_SCOPES, BibleIndex
+from data.lazy import LazyBibleIndex
+from data.lexical import (
+    LexicalIndex, build_bible_lexical_index, get_lexical_index_path, is_lexical_index_current,
+    load_lexical_index, search_lexical_indexes)
+from data.parallel import ParallelBibleIndex, load_versification
+from data.utils import encode_verse_range, make_bible_quote
+from data.loaders import load_bible
 from db.vector_store import search_text_chunks
-from workflows import rank_docs
+from metrics import registry, set_slow_threshold, timed
+from workflows import reciprocal_rank_fusion, rerank_docs
 
 
 logging.basicConfig(level=logging.INFO)
@@ -16,13 +26,99 @@ logger = logging.getLogger(__name__)
 
 # Create MCP server
 mcp_app = fastmcp.FastMCP("Bible-study-bot MCP")
+set_slow_threshold(config.get("metrics", {}).get("slow_threshold_seconds"))
 
-bible_versions = {}
+# In lazy mode, only the manifests are loaded here and books are loaded on first access
+lazy_config = config["data"].get("lazy", {})
+bible_indexes: dict[str, BibleIndex | LazyBibleIndex] = {}
+bibles: list[CompactBible] = []
+versifications = {}
+bible_version_paths: dict[str, Path] = {}
 for bible_version_path in config["data"]["bible_versions"]:
-    bible_version = load_bible_from_dir(
-        Path(bible_version_path))
-    bible_versions[bible_version.version] = bible_version
-assert len(bible_versions) > 0
+    with timed("corpus_load", version=Path(bible_version_path).name):
+        if lazy_config.get("enabled", False):
+            bible_index = LazyBibleIndex(
+                Path(bible_version_path), max_books=lazy_config.get("max_books", 8))
+            registry.gauge(
+                "bsb_lazy_books_hit_ratio", "Hit ratio of the lazily loaded books",
+                lambda bi=bible_index: bi.stats()["hit_rate"], version=bible_index.version)
+            bible_indexes[bible_index.version] = bible_index
+            bible_version_paths[bible_index.version] = Path(bible_version_path)
+        else:
+            bible = load_bible(
+                Path(bible_version_path), **config["data"].get("loader", {}))
+            bibles.append(bible)
+            versifications[bible.version] = load_versification(Path(bible_version_path))
+            bible_version_paths[bible.version] = Path(bible_version_path)
+
+# The loaded versions share one book/chapter/verse skeleton, which also serves the parallel verses
+parallel_index: ParallelBibleIndex | None = None
+if bibles:
+    with timed("parallel_index_build"):
+        parallel_index = ParallelBibleIndex(bibles, versifications)
+        for bible in bibles:
+            bible_indexes[bible.version] = parallel_index.get_index(bible.version)
+assert len(bible_indexes) > 0
+
+SEARCH_MODES = ["vector", "lexical", "hybrid"]
+
+
+def _load_lexical_index(version: str) -> LexicalIndex | None:
+    """
+    Load the lexical index of a version saved by compile-data.py, or build it from the
+    loaded Bible. Lazily loaded versions are skipped instead of loading every book.
+    """
+    bible_version_path = bible_version_paths[version]
+    lexical_index_path = get_lexical_index_path(bible_version_path)
+    if lexical_index_path.is_file() and is_lexical_index_current(lexical_index_path, bible_version_path):
+        return load_lexical_index(lexical_index_path)
+    bible = next((bible for bible in bibles if bible.version == version), None)
+    if bible is None:
+        logger.warning("No current %s in %s; lexical search skips %s until scripts/compile-data.py is run",
+                       lexical_index_path.name, bible_version_path, version)
+        return None
+    logger.info("No current %s in %s, indexing %s", lexical_index_path.name, bible_version_path, version)
+    return build_bible_lexical_index(bible)
+
+lexical_indexes: list[LexicalIndex] = []
+if config.get("search", {}).get("lexical_index", True):
+    for version in bible_indexes:
+        with timed("lexical_index_load", version=version):
+            lexical_index = _load_lexical_index(version)
+        if lexical_index is not None:
+            lexical_indexes.append(lexical_index)
+    logger.info("Loaded the lexical indexes over %d chunks", sum(len(li) for li in lexical_indexes))
+
+
+@mcp_app.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    """
+    Serve the latency histograms, counters and cache gauges in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def _check_verse_range(
+        book: str,
+        from_chapter: int, from_verse: int,
+        to_chapter: int | None, to_verse: int | None,
+        version: str | None) -> tuple[str, int, int, int, int, str]:
+    """
+    Validate a verse range and fill in its defaults.
+    """
+    book = book.lower()
+    to_chapter = to_chapter or from_chapter
+    to_verse = to_verse or from_verse
+
+    assert 1 <= from_chapter <= to_chapter, "Invalid chapter range: 'from' is after 'to'"
+    assert 1 <= from_verse and 1 <= to_verse, "Invalid verse: verses start at 1"
+    if from_chapter == to_chapter:
+        assert from_verse <= to_verse, "Invalid verse range: 'from' is after 'to'"
+
+    version = version or list(bible_indexes.keys())[0]
+    assert version in bible_indexes, "Invalid version. Valid versions are: " + ", ".join(bible_indexes.keys())
+    return book, from_chapter, from_verse, to_chapter, to_verse, version
 
 
 @mcp_app.tool(
@@ -36,47 +132,17 @@ async def get_bible_verses(
         to_verse: int | None = None,
         version: str | None = None) -> dict:
     try:
-        book = book.lower()
-        to_chapter = to_chapter or from_chapter
-        to_verse = to_verse or from_verse
+        book, from_chapter, from_verse, to_chapter, to_verse, version = _check_verse_range(
+            book, from_chapter, from_verse, to_chapter, to_verse, version)
         logger.info("Getting Bible verses: %s %d:%d to %d:%d (version: %s)",
-                    book, from_chapter, from_verse, to_chapter, to_verse,
-                    version or "default")
+                    book, from_chapter, from_verse, to_chapter, to_verse, version)
 
-        assert 1 <= from_chapter <= to_chapter
-        assert 1 <= from_verse and 1 <= to_verse
-        if from_chapter == to_chapter:
-            assert from_verse <= to_verse
-
-        version = version or list(bible_versions.keys())[0]
-        bible_version = bible_versions[version]
-
-        bible_book = None
-        for bb in bible_version.books:
-            if bb.book == book:
-                bible_book = bb
-                break
-        assert isinstance(bible_book, BibleBook), "Invalid book name. Valid names are: " + ", ".join([bb.book for bb in bible_version.books])
-
-        got_from_v = False
-        got_to_v = False
-        verses = []
-        for bv in bible_book.verses:
-            if not got_from_v:
-                if bv.chapter == from_chapter and bv.verse == from_verse:
-                    got_from_v = True
-            if got_from_v:
-                verses.append(bv)
-            if not got_to_v:
-                if bv.chapter == to_chapter and bv.verse == to_verse:
-                    got_to_v = True
-            if got_to_v:
-                break
-        assert got_from_v, "Invalid 'from' verse"
-        assert got_to_v, "Invalid 'to' verse"
-
-        bible_quote = make_bible_quote(
-            book=book, verses=verses)
+        with timed("get_bible_verses"):
+            verses = bible_indexes[version].get_verses(
+                book, from_chapter, from_verse, to_chapter, to_verse)
+
+            bible_quote = make_bible_quote(
+                book=book, verses=verses)
         return bible_quote.model_dump()
 
     except Exception as e:
@@ -86,27 +152,168 @@ async def get_bible_verses(
         }
 
 
+@mcp_app.tool(
+        name="get_bible_verses_batch",
+        description="一次提取多段圣经经文范围（可指定不同的译本），每段分别返回经文或错误。")
+async def get_bible_verses_batch(
+        ranges: list[BibleVerseRange],
+        version: str | None = None) -> dict:
+    """
+    Get several verse ranges in one call. A range without a version uses the version
+    argument (or the default version). The results are in the order of the ranges, and
+    a range that fails gets an error without failing the others.
+    """
+    logger.info("Getting %d ranges of Bible verses (version: %s)", len(ranges), version or "default")
+    results: list[dict | None] = [None] * len(ranges)
+    # Group the ranges by version and book, so that every book index is looked up (and lazily loaded) once
+    groups: dict[tuple[str, str], list[tuple[int, tuple]]] = {}
+    for i, verse_range in enumerate(ranges):
+        try:
+            checked_range = _check_verse_range(
+                verse_range.book, verse_range.from_chapter, verse_range.from_verse,
+                verse_range.to_chapter, verse_range.to_verse, verse_range.version or version)
+            groups.setdefault((checked_range[5], checked_range[0]), []).append((i, checked_range))
+        except Exception as e:
+            results[i] = {"error": str(e)}
+
+    with timed("get_bible_verses_batch"):
+        for (range_version, book), book_ranges in groups.items():
+            try:
+                book_index = bible_indexes[range_version].get_book(book)
+            except Exception as e:
+                for i, _ in book_ranges:
+                    results[i] = {"error": str(e)}
+                continue
+            for i, (_, from_chapter, from_verse, to_chapter, to_verse, _) in book_ranges:
+                try:
+                    verses = book_index.get_verses(from_chapter, from_verse, to_chapter, to_verse)
+                    results[i] = make_bible_quote(book=book, verses=verses).model_dump()
+                except Exception as e:
+                    results[i] = {"error": str(e)}
+
+    n_errors = sum(1 for result in results if "error" in result)
+    if n_errors > 0:
+        logger.error("%d of the %d ranges failed in get_bible_verses_batch", n_errors, len(ranges))
+    return {
+        "results": results}
+
+
+@mcp_app.tool(
+        name="get_parallel_bible_verses",
+        description="并排提取多个译本中同一段圣经经文（对照本），每节经文列出各译本的文字。")
+async def get_parallel_bible_verses(
+        book: str,
+        from_chapter: int,
+        from_verse: int,
+        to_chapter: int | None = None,
+        to_verse: int | None = None,
+        versions: list[str] | None = None) -> dict:
+    """
+    Get a verse range side by side from several versions (all the loaded versions by default).
+    The verses follow the shared versification, and a version without a verse has a null text.
+    """
+    try:
+        assert parallel_index is not None, "Parallel verses are not available when the Bible versions are loaded lazily"
+        book, from_chapter, from_verse, to_chapter, to_verse, _ = _check_verse_range(
+            book, from_chapter, from_verse, to_chapter, to_verse, None)
+        versions = versions or parallel_index.versions
+        logger.info("Getting parallel Bible verses: %s %d:%d to %d:%d (versions: %s)",
+                    book, from_chapter, from_verse, to_chapter, to_verse, ", ".join(versions))
+
+        with timed("get_parallel_bible_verses"):
+            parallel_verses = parallel_index.get_verses(
+                book, from_chapter, from_verse, to_chapter, to_verse, versions=versions)
+        return {
+            "range": encode_verse_range(book, parallel_verses[0], parallel_verses[-1]),
+            "versions": versions,
+            "verses": [pv._asdict() for pv in parallel_verses]}
+
+    except Exception as e:
+        logger.error("Error in get_parallel_bible_verses: %s", e)
+        return {
+            "error": str(e)
+        }
+
+
+@mcp_app.tool(
+        name="get_verse_context",
+        description="提取一节经文及其上下文（前后的经文），上下文范围可为整卷书（book）、同一章（chapter）或仅该节经文（verse）。")
+async def get_verse_context(
+        book: str,
+        chapter: int,
+        verse: int,
+        context_scope: str = "chapter",
+        n_prev_verses: int = 2,
+        n_next_verses: int = 2,
+        version: str | None = None) -> dict:
+    try:
+        book = book.lower()
+        logger.info("Getting the context of %s %d:%d (scope: %s, -%d/+%d, version: %s)",
+                    book, chapter, verse, context_scope, n_prev_verses, n_next_verses,
+                    version or "default")
+
+        assert context_scope in CONTEXT_SCOPES, "Invalid context_scope. Valid scopes are: " + ", ".join(CONTEXT_SCOPES)
+        assert n_prev_verses >= 0 and n_next_verses >= 0
+
+        version = version or list(bible_indexes.keys())[0]
+        assert version in bible_indexes, "Invalid version. Valid versions are: " + ", ".join(bible_indexes.keys())
+        with timed("get_verse_context"):
+            verses = bible_indexes[version].get_verse_context(
+                book, chapter, verse, context_scope,
+                n_prev_context_verses=n_prev_verses,
+                n_next_context_verses=n_next_verses)
+
+            bible_quote = make_bible_quote(
+                book=book, verses=verses)
+        return bible_quote.model_dump()
+
+    except Exception as e:
+        logger.error("Error in get_verse_context: %s", e)
+        return {
+            "error": str(e)
+        }
+
+
 @mcp_app.tool(
         name="search_bible_chunks",
         description="搜寻与查找相关的圣经经文或文本片段，以回答用户关于特定主题、经文或神学概念的问题。")
 async def search_bible_chunks(
         query: str,
-        min_score: float = 3.0, top_k: int = 5) -> dict:
+        min_score: float = 3.0, top_k: int = 5,
+        mode: str = "hybrid") -> dict:
     """
     Search for Bible verses or text chunks relevant to the query.
     Use this tool to find relevant scripture when the user asks about specific topics, verses, or theological concepts in the Bible.
+    mode is "vector" (embedding search), "lexical" (exact characters, for names, places and short quotations) or "hybrid" (both).
+    "hybrid" falls back to "vector" when no lexical index is loaded.
     """
     assert top_k > 0, "top_k must be greater than 0"
-    logger.info("Searching Bible chunks for query: %s", query)
+    if mode not in SEARCH_MODES:
+        return {"error": f"Invalid mode. Valid modes are: {', '.join(SEARCH_MODES)}"}
+    if mode == "lexical" and not lexical_indexes:
+        return {"error": "The lexical index is disabled; use mode 'vector'"}
+    if mode == "hybrid" and not lexical_indexes:
+        # Without a lexical index (disabled, or not compiled for lazily loaded versions), hybrid is vector-only
+        mode = "vector"
+    logger.info("Searching Bible chunks (%s) for query: %s", mode, query)
 
-    text_chunks = search_text_chunks(
-        query,
-        filters={"category": "bible"},
-        top_k=top_k * 2,)
+    result_lists = []
+    if mode in ["vector", "hybrid"]:
+        result_lists.append(search_text_chunks(
+            query,
+            filters={"category": "bible"},
+            top_k=top_k * 2,))
+    if mode in ["lexical", "hybrid"]:
+        with timed("lexical_search"):
+            result_lists.append(search_lexical_indexes(
+                lexical_indexes, query,
+                filters={"category": "bible"},
+                top_k=top_k * 2,))
+    text_chunks = reciprocal_rank_fusion(result_lists)[:top_k * 2]
     logger.info("Found %s text chunks", len(text_chunks))
 
     text_list = [tc["text"] for tc in text_chunks]
-    ranked_docs = rank_docs(query=query, docs=text_list)
+    ranked_docs = rerank_docs(query=query, docs=text_list)
     if "error" in ranked_docs:
         logger.error("Error in ranking docs: %s", ranked_docs["error"])
         return {"error": ranked_docs["error"]}
@@ -0,0 +1,203 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import math
+import threading
+import time
+from typing import Callable, Iterator
+
+
+logger = logging.getLogger("metrics")
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+LabelsKey = tuple[tuple[str, str], ...]
+
+
+def _labels_key(labels: dict[str, str]) -> LabelsKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelsKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: dict[LabelsKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # labels -> (bucket counts, sum, count)
+        self._values: dict[LabelsKey, tuple[list[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[i] += 1
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in self._values.items():
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(key, (('le', _format_value(upper_bound)),))} {bucket_count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    A gauge read from a callback, per set of labels, when the metrics are rendered.
+    """
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._reads: dict[LabelsKey, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def set_read(self, read: Callable[[], float], **labels: str) -> None:
+        with self._lock:
+            self._reads[_labels_key(labels)] = read
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            reads = list(self._reads.items())
+        for key, read in reads:
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(read())}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+        self._lock = threading.Lock()
+        self.slow_threshold_seconds: float | None = None
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def histogram(self, name: str, description: str = "") -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description)
+            return self._metrics[name]
+
+    def gauge(self, name: str, description: str, read: Callable[[], float], **labels: str) -> Gauge:
+        """
+        Register (or replace) the callback reading the gauge name for the given labels.
+        """
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Gauge(name, description)
+            gauge = self._metrics[name]
+        gauge.set_read(read, **labels)
+        return gauge
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format, *args)
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve the registry at /metrics from a daemon thread, for processes without a web
+    server of their own, such as the Streamlit UI that runs the agent.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving the metrics at http://%s:%d/metrics", host, port)
+    return server
+
+
+def set_slow_threshold(seconds: float | None) -> None:
+    """
+    Log a warning for every timed stage slower than seconds (None disables the slow log).
+    """
+    registry.slow_threshold_seconds = seconds
+
+
+@contextmanager
+def timed(stage: str, **labels: str) -> Iterator[None]:
+    """
+    Record the latency of a stage in the histogram bsb_<stage>_seconds,
+    and count exceptions in bsb_<stage>_errors_total.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.counter(f"bsb_{stage}_errors_total", f"Errors in {stage}").inc(**labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start_time
+        registry.histogram(f"bsb_{stage}_seconds", f"Latency of {stage} in seconds").observe(elapsed, **labels)
+        threshold = registry.slow_threshold_seconds
+        if threshold is not None and elapsed >= threshold:
+            logger.warning("Slow %s (%s): %.3fs", stage, labels, elapsed)
@@ -0,0 +1,117 @@
+import asyncio
+from collections import deque
+import logging
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+
+from data.definitions import AgentRunStatus, AgentState, BSBTaskAgent
+from data.references import format_reference_quotes
+from metrics import timed
+
+
+logger = logging.getLogger(__name__)
+
+
+def sort_plan(plan: dict) -> tuple[list[str], dict[str, list[str]]]:
+    """
+    Return the node IDs of a plan DAG in dependency order, and the parents of every node
+    (a node depends on the nodes listing it as a child).
+    Raises a ValueError if the plan refers to unknown nodes or has a cycle.
+    """
+    nodes: dict[str, dict] = plan["nodes"]
+    children: dict[str, list[str]] = {
+        node_id: [str(child_id) for child_id in node.get("children", [])]
+        for node_id, node in nodes.items()}
+    parents: dict[str, list[str]] = {node_id: [] for node_id in nodes}
+    for node_id, node_children in children.items():
+        for child_id in node_children:
+            if child_id not in nodes:
+                raise ValueError(f"Node {node_id} of the plan has an unknown child {child_id}")
+            parents[child_id].append(node_id)
+
+    # Kahn's algorithm; the nodes left with pending parents are on a cycle
+    n_pending_parents = {node_id: len(node_parents) for node_id, node_parents in parents.items()}
+    ready = deque(node_id for node_id, n in n_pending_parents.items() if n == 0)
+    order = []
+    while ready:
+        node_id = ready.popleft()
+        order.append(node_id)
+        for child_id in children[node_id]:
+            n_pending_parents[child_id] -= 1
+            if n_pending_parents[child_id] == 0:
+                ready.append(child_id)
+    if len(order) < len(nodes):
+        cyclic = [node_id for node_id, n in n_pending_parents.items() if n > 0]
+        raise ValueError(f"The plan has a cycle through the nodes {', '.join(cyclic)}")
+    return order, parents
+
+
+class PlanExecutor:
+    """
+    Runs every node of the planner's DAG with the agent of its service: a node starts
+    once all its parents are done, with the quoted scripture references and its parents'
+    inputs and answers as context, and independent nodes run concurrently, at most
+    max_concurrent_tasks at a time.
+    """
+
+    def __init__(self, services: dict[str, dict], max_concurrent_tasks: int = 4):
+        assert max_concurrent_tasks > 0
+        self.services = services
+        self.max_concurrent_tasks = max_concurrent_tasks
+
+    async def _run_node(
+            self, node_id: str, node: dict, context_messages: list,
+            semaphore: asyncio.Semaphore, config: RunnableConfig | None) -> list[dict]:
+        service = self.services.get(node["service"])
+        assert service is not None, f"Invalid service {node['service']} in the plan"
+        agent: BSBTaskAgent = service["agent"]
+        assert isinstance(agent, BSBTaskAgent), f"The agent of the service {node['service']} cannot run plan tasks"
+        # Tag the runs of the node, so that streamed tokens can be told apart
+        node_config: RunnableConfig = {
+            **(config or {}),
+            "metadata": {**(config or {}).get("metadata", {}), "plan_node_id": node_id}}
+        async with semaphore:
+            with timed("plan_node", service=node["service"]):
+                return await agent.arun_task(node["input"], context_messages, node_config)
+
+    async def ainvoke(self, state: AgentState, config: RunnableConfig | None = None) -> dict:
+        plan = state["plan"]
+        nodes: dict[str, dict] = plan["nodes"]
+        order, parents = sort_plan(plan)
+        semaphore = asyncio.Semaphore(self.max_concurrent_tasks)
+        tasks: dict[str, asyncio.Task] = {}
+        reference_messages = []
+        if state.get("references"):
+            reference_messages.append(SystemMessage(content=format_reference_quotes(state["references"])))
+
+        async def run_after_parents(node_id: str) -> list[dict]:
+            parent_results = await asyncio.gather(*(tasks[p] for p in parents[node_id]))
+            context_messages = list(reference_messages)
+            for parent_id, parent_messages in zip(parents[node_id], parent_results):
+                context_messages.append(HumanMessage(content=nodes[parent_id]["input"]))
+                if parent_messages:
+                    context_messages.append(AIMessage(content=parent_messages[-1].get("content", "")))
+            return await self._run_node(node_id, nodes[node_id], context_messages, semaphore, config)
+
+        # Every node task awaits the tasks of its parents, which are created before it
+        for node_id in order:
+            tasks[node_id] = asyncio.create_task(run_after_parents(node_id))
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        messages = []
+        updated_nodes = {}
+        for node_id, result in zip(tasks.keys(), results):
+            if isinstance(result, BaseException):
+                logger.error("Plan node %s failed: %s", node_id, result)
+                updated_nodes[node_id] = {**nodes[node_id], "status": AgentRunStatus.FAILED.value}
+            else:
+                messages.extend(result)
+                updated_nodes[node_id] = {**nodes[node_id], "status": AgentRunStatus.SUCCESS.value}
+        if results and all(isinstance(result, BaseException) for result in results):
+            raise results[0]
+        return {
+            "messages": messages,
+            "plan": {"nodes": updated_nodes},
+        }
+
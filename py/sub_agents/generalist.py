@@ -1,13 +1,15 @@
-import asyncio
-
 from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import MessagesState, StateGraph, START, END
 from langgraph.prebuilt import ToolNode
 
-from config import httpx_client, httpx_async_client, mcp_client, web_search_tool
-from data.definitions import AgentState, PROFESSION_OF_FAITH, BSBAgent
+from config import get_mcp_tools, httpx_client, httpx_async_client, web_search_tool
+from data.definitions import AgentState, PROFESSION_OF_FAITH, BSBTaskAgent
+
 
+# Tags the LLM runs of the generalist, whose tokens are streamed to the user as the answer
+FINAL_ANSWER_TAG = "final_answer"
 
 # 1. Global variable for the system prompt. You can edit this!
 prompt_template = """你是一位聖經學習助手，專注於幫助使用者理解和學習聖經內容。請根據使用者的問題或請求，本著聖經的信息來回到以聖經為出發點的答案。
@@ -19,7 +21,7 @@ prompt_template = """你是一位聖經學習助手，專注於幫助使用者
 """
 
 
-class GeneralistAgent(BSBAgent):
+class GeneralistAgent(BSBTaskAgent):
     targeted_services = [
         "question_answering",
         "small_group_discussion",
@@ -31,21 +33,22 @@ class GeneralistAgent(BSBAgent):
             user_request=user_request,)
 
     async def _create_graph(self) -> StateGraph:
-        mcp_tools = await mcp_client.get_tools()
+        mcp_tools = await get_mcp_tools()
         tools: list = [mt for mt in mcp_tools]
         if web_search_tool:
             tools.append(web_search_tool)
 
         llm = ChatOpenAI(model="gpt-4.1-mini-2025-04-14",
                         http_client=httpx_client,
-                        http_async_client=httpx_async_client,)
+                        http_async_client=httpx_async_client,
+                        tags=[FINAL_ANSWER_TAG],)
         llm_with_tools = llm.bind_tools(tools)
 
-        def call_llm(state: MessagesState):
+        async def call_llm(state: MessagesState):
             messages = state["messages"]
             assert isinstance(messages, list), "messages is not a list"
             assert len(messages) > 0, "messages is empty"
-            response = llm_with_tools.invoke(messages)
+            response = await llm_with_tools.ainvoke(messages)
             return {"messages": [response]}
 
         def should_continue(state: MessagesState):
@@ -64,25 +67,35 @@ class GeneralistAgent(BSBAgent):
 
         return workflow.compile()
 
-    def invoke (self, state: AgentState) -> dict:
-        node_id = self._find_task(state)
-        if node_id is None:
-            return {}
-
-        task_input = state["plan"]["nodes"][node_id]["input"]
-        input_messages = [
+    async def arun_task(
+            self, task_input: str, context_messages: list,
+            config: RunnableConfig | None = None) -> list[dict]:
+        """
+        Answer task_input after the context messages. The config of the parent graph is
+        passed on, so its astream_events() also sees the LLM tokens of this agent.
+        """
+        input_messages = context_messages + [
             HumanMessage(content=task_input)]
         task_state = MessagesState(
             messages=input_messages)
 
-        full_messages_state = asyncio.run(self.graph.ainvoke(task_state))
+        graph = await self.get_graph()
+        full_messages_state = await graph.ainvoke(task_state, config=config)
         full_messages = full_messages_state["messages"]
         assert isinstance(full_messages, list) and len(full_messages) > len(input_messages), "Invalid full messages"
 
         new_messages = full_messages[len(input_messages):]
-        new_messages = [
+        return [
             m if isinstance(m, dict) else m.model_dump()
             for m in new_messages]
+
+    async def ainvoke (self, state: AgentState, config: RunnableConfig | None = None) -> dict:
+        node_id = self._find_task(state)
+        if node_id is None:
+            return {}
+
+        task_input = state["plan"]["nodes"][node_id]["input"]
+        new_messages = await self.arun_task(task_input, [], config)
         return {
             "messages": new_messages,}
 
@@ -1,13 +1,49 @@
-import asyncio
+import copy
 import json
+import logging
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
 
-from config import httpx_client, httpx_async_client, mcp_client
+from cache import LRUCache
+from config import config, get_mcp_tools, httpx_client, httpx_async_client
 from data.definitions import PROFESSION_OF_FAITH, AgentState, BSBAgent
+from db.embedding_cache import normalize_query_text
+from metrics import registry
+from sub_agents.router import route_request
+
+
+logger = logging.getLogger(__name__)
+
+agent_config = config.get("agent", {})
+router_config = agent_config.get("router", {})
+
+# Plans keyed on the normalized user request, whichever route made them
+plan_cache = LRUCache(
+    maxsize=agent_config.get("plan_cache", {}).get("max_entries", 1024),
+    ttl=agent_config.get("plan_cache", {}).get("ttl_seconds", 3600))
+
+# Number of plans made by each route: "cache", "fast" (the local router) or "llm" (the planner).
+# The gauges below live in the agent process and are served by the UI's metrics server (metrics.ui_port)
+PLAN_ROUTES = ["cache", "fast", "llm"]
+plan_route_counts = {route: 0 for route in PLAN_ROUTES}
+
+def plan_route_stats() -> dict:
+    n_plans = sum(plan_route_counts.values())
+    return {
+        **plan_route_counts,
+        "fast_path_rate": plan_route_counts["fast"] / n_plans if n_plans else 0.0,
+    }
+
+registry.gauge(
+    "bsb_plan_cache_hit_ratio", "Hit ratio of the plan cache",
+    lambda: plan_cache.stats()["hit_rate"])
+registry.gauge(
+    "bsb_plan_fast_path_ratio", "Share of the plans made by the local router instead of the LLM planner",
+    lambda: plan_route_stats()["fast_path_rate"])
 
 
 class PlannerAgent(BSBAgent):
@@ -68,7 +104,7 @@ class PlannerAgent(BSBAgent):
 
 
     async def _create_graph(self) -> StateGraph:
-        mcp_tools = await mcp_client.get_tools()
+        mcp_tools = await get_mcp_tools()
         tools = mcp_tools
 
         llm = ChatOpenAI(model="gpt-4.1-mini-2025-04-14",
@@ -76,8 +112,8 @@ class PlannerAgent(BSBAgent):
                         http_async_client=httpx_async_client,)
         llm_with_tools = llm.bind_tools(tools)
 
-        def call_llm(state: AgentState):
-            response = llm_with_tools.invoke(state["messages"])
+        async def call_llm(state: AgentState):
+            response = await llm_with_tools.ainvoke(state["messages"])
             return {"messages": [response]}
 
         def should_continue(state: AgentState):
@@ -97,30 +133,48 @@ class PlannerAgent(BSBAgent):
         return workflow.compile()
 
 
-    def invoke (self, state: AgentState) -> dict:
+    async def ainvoke (self, state: AgentState, config: RunnableConfig | None = None) -> dict:
         """
         Create a planner node for building the multi-agent system.
         """
         last_message = state["messages"][-1]
         user_request = last_message["content"]
 
-        plan = asyncio.run(self.make_plan(user_request))
+        # Reuse the plan of a repeated request, then try the local router before the LLM planner
+        cache_key = normalize_query_text(user_request)
+        plan = plan_cache.get(cache_key)
+        route = "cache"
+        if plan is None and router_config.get("enabled", True):
+            plan = route_request(user_request, max_chars=router_config.get("max_chars", 80))
+            route = "fast"
+        if plan is None:
+            plan = await self.make_plan(user_request, config)
+            route = "llm"
+        if route != "cache":
+            plan_cache.put(cache_key, plan)
+        plan_route_counts[route] += 1
+        registry.counter("bsb_plans_total", "Plans made, by route").inc(route=route)
+        logger.info("Made the plan with the %s route (fast path rate: %.2f, plan cache hit rate: %.2f)",
+                    route, plan_route_stats()["fast_path_rate"], plan_cache.stats()["hit_rate"])
+
+        # The cached plan is shared, so the state gets a copy
         return {
-            "plan": plan,
+            "plan": {**copy.deepcopy(plan), "route": route},
         }
 
 
-    async def make_plan(self, user_request: str) -> dict:
+    async def make_plan(self, user_request: str, config: RunnableConfig | None = None) -> dict:
         """
         According to the user's request, generate a plan.
         The plan should be a JSON object describing a directed acyclic graph (DAG),
         """
         prompt = self._create_prompt(user_request)
-        response = await self.graph.ainvoke({
+        graph = await self.get_graph()
+        response = await graph.ainvoke({
             "messages": [
                 {"role": "user", "content": prompt}
             ]
-        })
+        }, config=config)
         assert isinstance(response, dict), f"Invalid response type: {type(response)}"
         last_message: AIMessage = response["messages"][-1]
         assert isinstance(last_message, AIMessage), "Last message is not an AIMessage"
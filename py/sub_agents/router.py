@@ -0,0 +1,64 @@
+import re
+
+
+# Markers of requests with several parts, which are left to the LLM planner
+MULTI_PART_MARKERS = [
+    "以及", "并且", "並且", "另外", "还有", "還有", "然后", "然後", "同时", "同時",
+    "首先", "其次", "最后", "最後", "第一", "第二",
+    " and then ", " also ", "first,", "second,",
+]
+
+# Interrogative words; a simple question has at most one
+INTERROGATIVES = [
+    "什么", "什麼", "为什么", "為什麼", "为何", "為何", "怎么", "怎麼", "怎样", "怎樣", "如何",
+    "哪", "谁", "誰", "几", "幾", "多少", "是否", "吗", "嗎", "呢",
+    "what", "why", "how", "who", "which", "when", "where",
+]
+
+# Requests mentioning these are routed to the small group discussion service
+SMALL_GROUP_KEYWORDS = ["小组", "小組", "讨论", "討論", "查经", "查經", "分享题", "分享題", "discussion"]
+
+_SENTENCE_END_PATTERN = re.compile(r"[。？！?!；;]+")
+_NUMBERED_ITEM_PATTERN = re.compile(r"(^|\s)(\d+[.、)]|[一二三四五][、.])")
+
+
+def _count_interrogatives(text: str) -> int:
+    # Longer words first, so that 为什么 is not also counted as 什么
+    count = 0
+    for word in sorted(INTERROGATIVES, key=len, reverse=True):
+        pattern = rf"\b{word}\b" if word.isascii() else re.escape(word)
+        count += len(re.findall(pattern, text))
+        text = re.sub(pattern, " ", text)
+    return count
+
+
+def route_request(user_request: str, max_chars: int = 80) -> dict | None:
+    """
+    Return a single-node plan for a simple request, without calling the LLM planner,
+    or None when the request may have several parts.
+    A request is simple when it is short, has a single sentence with at most one
+    interrogative, and has no multi-part markers or numbered items.
+    """
+    text = user_request.strip().lower()
+    if len(text) == 0 or len(text) > max_chars or "\n" in text:
+        return None
+    sentences = [s for s in _SENTENCE_END_PATTERN.split(text) if s.strip()]
+    if len(sentences) > 1:
+        return None
+    if any(marker in text for marker in MULTI_PART_MARKERS) or _NUMBERED_ITEM_PATTERN.search(text):
+        return None
+    if _count_interrogatives(text) > 1:
+        return None
+
+    service = "small_group_discussion" if any(k in text for k in SMALL_GROUP_KEYWORDS) else "question_answering"
+    return {
+        "root": "1",
+        "nodes": {
+            "1": {
+                "id": "1",
+                "service": service,
+                "input": user_request.strip(),
+                "children": [],
+            }
+        },
+    }
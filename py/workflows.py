@@ -1,10 +1,50 @@
+import hashlib
 import json
+import logging
 from typing import List, Dict, Any
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
-from config import config
+from cache import LRUCache
+from config import config, create_chat_model
+from data.lexical import LexicalIndex
+from data.utils import query_terms
+from metrics import registry, timed
+
+
+logger = logging.getLogger(__name__)
+
+reranker_config = config.get("reranker", {})
+RERANKER_BACKENDS = ["llm", "local", "local-then-llm"]
+reranker_backend = reranker_config.get("backend", "llm")
+assert reranker_backend in RERANKER_BACKENDS, f"Invalid {reranker_backend = }"
+
+# One shared LLM client (and connection pool) for every rank_docs call,
+# with JSON mode enabled for structured output
+rank_llm = create_chat_model(
+    model_kwargs={"response_format": {"type": "json_object"}})
+
+# Rankings keyed on the query and the hashes of the documents, in order
+rank_cache = LRUCache(
+    maxsize=reranker_config.get("cache", {}).get("max_entries", 1024),
+    ttl=reranker_config.get("cache", {}).get("ttl_seconds", 3600))
+
+# Local scores are calibrated to the 0-5 scale of the LLM: the coverage of the query's content
+# bigrams and characters (see query_terms), bigrams weighing more, saturates at 5 when it
+# reaches LOCAL_FULL_SCORE_COVERAGE. On sample questions, chunks quoting the answer score
+# 3.3-5 and chunks answering other questions mostly below 3 (the default min_score).
+LOCAL_UNIGRAM_WEIGHT = 0.4
+LOCAL_FULL_SCORE_COVERAGE = 0.6
+
+registry.gauge(
+    "bsb_rank_cache_hit_ratio", "Hit ratio of the rerank result cache",
+    lambda: rank_cache.stats()["hit_rate"])
+
+
+def _rank_cache_key(query: str, docs: List[str]) -> tuple:
+    return (query, tuple(
+        hashlib.sha256(doc.encode("utf-8")).hexdigest()
+        for doc in docs))
 
 
 def rank_docs(query: str, docs: List[str]) -> Dict[str, Any]:
@@ -28,11 +68,11 @@ def rank_docs(query: str, docs: List[str]) -> Dict[str, Any]:
     if len(docs) == 0:
         return {"ranked": []}
 
-    # Initialize LLM with JSON mode enabled for structured output
-    llm = ChatOpenAI(
-        model=config["llm"]["model"],
-        model_kwargs={"response_format": {"type": "json_object"}}
-    )
+    cache_key = _rank_cache_key(query, docs)
+    cached_result = rank_cache.get(cache_key)
+    if cached_result is not None:
+        logger.info("Rank cache hit for query: %s", query)
+        return cached_result
 
     # Format documents with IDs
     docs_input = "\n\n".join([f"ID {i}:\n{doc}" for i, doc in enumerate(docs)])
@@ -62,7 +102,8 @@ Task:
         HumanMessage(content=prompt)
     ]
 
-    response = llm.invoke(messages)
+    with timed("rank_docs", backend="llm"):
+        response = rank_llm.invoke(messages)
     
     try:
         result = json.loads(response.content)
@@ -74,7 +115,92 @@ Task:
             result["ranked"], 
             key=lambda x: float(x.get("score", 0)), 
             reverse=True)
+        # Only successful rankings are cached
+        rank_cache.put(cache_key, result)
         return result
 
     except Exception as e:
         return {"error": str(e)}
+
+
+def rank_docs_locally(
+        query: str, docs: List[str],
+        k1: float = 1.5, b: float = 0.75) -> Dict[str, Any]:
+    """
+    Reranks the relevance of the docs against the query by their character unigrams
+    and bigrams, without any network call.
+    The score of a doc grows with the fraction of the query's content bigrams and
+    characters it contains, on the absolute 0-5 scale of the LLM scores of rank_docs.
+    Docs with the same score are ordered by BM25.
+
+    Returns:
+        The same format as rank_docs.
+    """
+    if len(docs) == 0:
+        return {"ranked": []}
+
+    with timed("rank_docs", backend="local"):
+        lexical_index = LexicalIndex([{"text": doc} for doc in docs], k1=k1, b=b)
+        bm25_scores = lexical_index.scores(query)
+        unigrams = query_terms(query, 1)
+        # A one-character query has no bigrams
+        bigrams = query_terms(query, 2) or unigrams
+        unigram_coverages = lexical_index.term_coverage(unigrams) if unigrams else {}
+        bigram_coverages = lexical_index.term_coverage(bigrams) if bigrams else {}
+    scores = []
+    for i in range(len(docs)):
+        coverage = (
+            LOCAL_UNIGRAM_WEIGHT * unigram_coverages.get(i, 0.0)
+            + (1 - LOCAL_UNIGRAM_WEIGHT) * bigram_coverages.get(i, 0.0))
+        scores.append(round(5.0 * min(1.0, coverage / LOCAL_FULL_SCORE_COVERAGE), 3))
+    ranked = sorted(
+        range(len(docs)), key=lambda i: (scores[i], bm25_scores.get(i, 0.0)), reverse=True)
+    return {"ranked": [{"index": i, "score": scores[i]} for i in ranked]}
+
+
+def rerank_docs(query: str, docs: List[str]) -> Dict[str, Any]:
+    """
+    Reranks the docs with the backend configured in reranker.backend:
+    - "llm": rank_docs
+    - "local": rank_docs_locally
+    - "local-then-llm": rank_docs_locally, then rank_docs over the best reranker.local_top_k docs
+
+    Returns:
+        The same format as rank_docs.
+    """
+    if reranker_backend == "llm":
+        return rank_docs(query=query, docs=docs)
+    if reranker_backend == "local":
+        return rank_docs_locally(query=query, docs=docs)
+
+    local_ranked = rank_docs_locally(query=query, docs=docs)["ranked"]
+    local_top_k = reranker_config.get("local_top_k", 10)
+    kept_indices = [rd["index"] for rd in local_ranked[:local_top_k]]
+    llm_ranked = rank_docs(query=query, docs=[docs[i] for i in kept_indices])
+    if "error" in llm_ranked:
+        return llm_ranked
+    # Map the indices of the kept docs back to the input docs (without touching the cached ranking)
+    ranked = []
+    for rd in llm_ranked["ranked"]:
+        index = int(rd.get("index", -1))
+        if 0 <= index < len(kept_indices):
+            ranked.append({**rd, "index": kept_indices[index]})
+    return {"ranked": ranked}
+
+
+def reciprocal_rank_fusion(
+        result_lists: List[List[dict]], k: int = 60) -> List[dict]:
+    """
+    Merges ranked lists of text chunk payloads with reciprocal-rank fusion:
+    each payload scores sum(1 / (k + rank)) over the lists it appears in.
+    Payloads are identified by their range and text.
+    """
+    fused_scores: Dict[tuple, float] = {}
+    fused_payloads: Dict[tuple, dict] = {}
+    for results in result_lists:
+        for rank, payload in enumerate(results, start=1):
+            key = (payload.get("range"), payload["text"])
+            fused_scores[key] = fused_scores.get(key, 0.0) + 1.0 / (k + rank)
+            fused_payloads.setdefault(key, payload)
+    ranked_keys = sorted(fused_scores, key=lambda key: fused_scores[key], reverse=True)
+    return [fused_payloads[key] for key in ranked_keys]
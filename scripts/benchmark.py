@@ -0,0 +1,223 @@
+import asyncio
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import click
+import yaml
+
+REPO_ROOT = Path(__file__).parents[1]
+DEFAULT_OUTPUT_DIR = REPO_ROOT / "build" / "benchmarks"
+
+logger = logging.getLogger(__name__)
+
+
+def _write_benchmark_config(work_dir: Path) -> Path:
+    """
+    Write a copy of config.yaml that runs offline: deterministic stub embedding and
+    chat providers, and a local vector store under work_dir.
+    """
+    with open(REPO_ROOT / "config.yaml", "r", encoding="utf-8") as f:
+        bench_config = yaml.safe_load(f)
+    bench_config["data"]["bible_versions"] = [
+        str(REPO_ROOT / bible_ver_dir) for bible_ver_dir in bench_config["data"]["bible_versions"]]
+    bench_config["data"]["lazy"] = {"enabled": False}
+    bench_config["embedding"].update(
+        provider="fake", fake_size=256,
+        cache={"max_entries": 4096, "sqlite_path": None})
+    # The stub reranker gives decreasing scores to the first 20 candidates
+    bench_config["llm"].update(
+        provider="fake",
+        fake_responses=[json.dumps({"ranked": [
+            {"index": i, "score": 5.0 - 0.2 * i} for i in range(20)]})])
+    bench_config["vector_store"].update(
+        provider="local",
+        local={"directory": str(work_dir / "vector_store"), "index": "brute"})
+    bench_config.setdefault("metrics", {})["slow_threshold_seconds"] = None
+
+    config_path = work_dir / "config.yaml"
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(bench_config, f, allow_unicode=True)
+    return config_path
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(percentile / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _measure(name: str, run_once: Callable[[int], None], n_iterations: int) -> dict:
+    """
+    Run run_once(i) n_iterations times and report throughput and latency percentiles,
+    plus the peak traced memory of one extra run.
+    """
+    latencies = []
+    start_time = time.perf_counter()
+    for i in range(n_iterations):
+        iteration_start = time.perf_counter()
+        run_once(i)
+        latencies.append(time.perf_counter() - iteration_start)
+    total = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    run_once(n_iterations)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = sorted(latencies)
+    result = {
+        "iterations": n_iterations,
+        "throughput_per_sec": n_iterations / total if total > 0 else 0.0,
+        "p50_ms": 1000 * _percentile(latencies, 50),
+        "p95_ms": 1000 * _percentile(latencies, 95),
+        "p99_ms": 1000 * _percentile(latencies, 99),
+        "peak_memory_bytes": peak_memory,
+    }
+    click.echo(
+        f"{name:<24} {result['throughput_per_sec']:>10.1f}/s  p50 {result['p50_ms']:>9.3f}ms"
+        f"  p95 {result['p95_ms']:>9.3f}ms  p99 {result['p99_ms']:>9.3f}ms"
+        f"  peak {result['peak_memory_bytes'] / 1e6:>8.1f}MB")
+    return result
+
+
+def _compare(results: dict, baseline: dict) -> None:
+    click.echo("\nCompared with the baseline (new / baseline):")
+    for name, result in results.items():
+        baseline_result = baseline.get("benchmarks", {}).get(name)
+        if baseline_result is None:
+            continue
+        ratios = {
+            key: result[key] / baseline_result[key] if baseline_result[key] else float("nan")
+            for key in ["throughput_per_sec", "p50_ms", "p99_ms", "peak_memory_bytes"]}
+        click.echo(
+            f"{name:<24} throughput x{ratios['throughput_per_sec']:.2f}  p50 x{ratios['p50_ms']:.2f}"
+            f"  p99 x{ratios['p99_ms']:.2f}  peak memory x{ratios['peak_memory_bytes']:.2f}")
+
+
+def _run_benchmarks(
+    work_dir: Path,
+    load_iterations: int,
+    lookup_iterations: int,
+    search_iterations: int,
+    seed: int
+) -> dict[str, dict]:
+    """
+    Run the benchmarks with the offline config and the local vector store under work_dir.
+    """
+    os.environ["BSB_CONFIG_PATH"] = str(_write_benchmark_config(work_dir))
+    # The agent-side MCP client is created on import but never connected here
+    os.environ.setdefault("BSB_MCP_SERVER", "http://localhost:8080/mcp")
+
+    # Import after the environment points at the offline config
+    from config import config
+    from data.definitions import TextChunk
+    from data.loaders import load_bible, load_bible_from_dir
+    from data.splitters import split_bible_book
+    from db.vector_store import add_text_chunks, search_text_chunks
+    import mcp_server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = random.Random(seed)
+    bible_ver_path = Path(config["data"]["bible_versions"][0])
+    bible_index = next(iter(mcp_server.bible_indexes.values()))
+
+    # Random verse ranges (within one chapter) and search queries taken from the corpus
+    ranges = []
+    queries = []
+    for _ in range(max(lookup_iterations, search_iterations) + 1):
+        book_index = bible_index.get_book(rng.choice(bible_index.book_names))
+        chapter = rng.choice(list(book_index.offsets.keys()))
+        verse_numbers = sorted(book_index.offsets[chapter].keys())
+        i_from = rng.randrange(len(verse_numbers))
+        i_to = min(len(verse_numbers) - 1, i_from + rng.randrange(10))
+        ranges.append((book_index.bible_book.book, chapter, verse_numbers[i_from], verse_numbers[i_to]))
+        verse_text = book_index.bible_book.verses[book_index.offsets[chapter][verse_numbers[i_from]]].text
+        queries.append(verse_text[:rng.randint(4, 12)])
+
+    # Publish the chunks to the local vector store (not measured)
+    click.echo("Publishing the chunks to the local vector store...")
+    chunks: list[TextChunk] = []
+    for book in bible_index.book_names:
+        for chunk in split_bible_book(bible_index.get_book(book).bible_book):
+            chunk.metadata["category"] = "bible"
+            chunk.metadata["version"] = bible_index.version
+            chunks.append(chunk)
+    add_text_chunks(chunks)
+
+    loop = asyncio.new_event_loop()
+    results = {}
+    results["load_bible_from_dir"] = _measure(
+        "load_bible_from_dir", lambda i: load_bible_from_dir(bible_ver_path), load_iterations)
+    results["load_bible"] = _measure(
+        "load_bible", lambda i: load_bible(bible_ver_path), load_iterations)
+    results["get_bible_verses"] = _measure(
+        "get_bible_verses",
+        lambda i: loop.run_until_complete(mcp_server.get_bible_verses(
+            book=ranges[i][0], from_chapter=ranges[i][1], from_verse=ranges[i][2], to_verse=ranges[i][3])),
+        lookup_iterations)
+    results["split_bible_book"] = _measure(
+        "split_bible_book",
+        lambda i: [split_bible_book(bible_index.get_book(book).bible_book) for book in bible_index.book_names],
+        load_iterations)
+    results["search_text_chunks"] = _measure(
+        "search_text_chunks",
+        lambda i: search_text_chunks(queries[i], filters={"category": "bible"}, top_k=10),
+        search_iterations)
+    for mode in mcp_server.SEARCH_MODES:
+        results[f"search_bible_chunks_{mode}"] = _measure(
+            f"search_bible_chunks_{mode}",
+            lambda i: loop.run_until_complete(mcp_server.search_bible_chunks(queries[i], mode=mode)),
+            search_iterations)
+    loop.close()
+    return results
+
+
+@click.command()
+@click.option("--load-iterations", default=3, show_default=True, help="Iterations of the corpus loading benchmarks.")
+@click.option("--lookup-iterations", default=2000, show_default=True, help="Iterations of the verse lookup benchmark.")
+@click.option("--search-iterations", default=200, show_default=True, help="Iterations of the search benchmarks.")
+@click.option("--seed", default=0, show_default=True, help="Seed of the random ranges and queries.")
+@click.option("--output", type=click.Path(path_type=Path), default=None,
+              help="Where to save the JSON results. Defaults to build/benchmarks/<timestamp>.json.")
+@click.option("--baseline", type=click.Path(exists=True, path_type=Path), default=None,
+              help="JSON results of an earlier run to compare against.")
+def main(
+    load_iterations: int,
+    lookup_iterations: int,
+    search_iterations: int,
+    seed: int,
+    output: Path | None,
+    baseline: Path | None
+):
+    """
+    Benchmark corpus loading, verse lookup, splitting and retrieval offline.
+    """
+    # The offline config and the local vector store are removed with the working directory
+    with tempfile.TemporaryDirectory(prefix="bsb-benchmark-") as work_dir:
+        results = _run_benchmarks(
+            Path(work_dir), load_iterations, lookup_iterations, search_iterations, seed)
+
+    output = output or DEFAULT_OUTPUT_DIR / f"{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now().isoformat(),
+            "seed": seed,
+            "benchmarks": results,
+        }, f, indent=2)
+    click.echo(f"\nSaved the results to {output}")
+
+    if baseline is not None:
+        with open(baseline, "r", encoding="utf-8") as f:
+            _compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
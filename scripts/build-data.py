@@ -1,3 +1,4 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import json
 import logging
@@ -27,26 +28,33 @@ def get_data_build_id() -> str:
 
 
 @click.command()
-@click.argument("data_file", default=DEFAULT_DATA_FILE, type=click.Path())
+@click.argument("data_file", default=DEFAULT_DATA_FILE, type=click.Path(path_type=Path))
+@click.option("--max-workers", type=int, default=None,
+              help="Number of processes splitting the books. Defaults to the number of CPUs.")
 def main(
-    data_file: Path
+    data_file: Path,
+    max_workers: int | None
 ):
     data_file.parent.mkdir(parents=True, exist_ok=True)
-    with data_file.open("w", encoding="utf-8") as f:
+    with data_file.open("w", encoding="utf-8") as f, ProcessPoolExecutor(max_workers=max_workers) as executor:
         # Load Bible versions
         for bible_ver_dir in config["data"]["bible_versions"]:
             bible_ver_path = Path(bible_ver_dir)
             assert bible_ver_path.is_dir()
 
             logger.info("Loading a Bible version from %s", bible_ver_dir)
-            bible_ver = load_bible_from_dir(bible_ver_path)
+            bible_ver = load_bible_from_dir(
+                bible_ver_path, **config["data"].get("loader", {}))
             assert isinstance(bible_ver, Bible)
 
-            for bible_book in bible_ver.books:
+            # Books are split in parallel, and map() keeps the chunks in book order
+            all_book_chunks = executor.map(split_bible_book, bible_ver.books)
+            for bible_book, book_chunks in zip(bible_ver.books, all_book_chunks):
                 logging.info("-- Processing the book of %s", bible_book.book)
-                book_chunks = split_bible_book(bible_book)
                 for b_chunk in book_chunks:
                     assert isinstance(b_chunk, TextChunk)
+                    b_chunk.metadata["version"] = bible_ver.version
+                    b_chunk.metadata["data_build"] = _data_build_timestamp
                     b_chunk.metadata["data_build_id"] = get_data_build_id()
                     f.write(json.dumps(b_chunk.model_dump(), ensure_ascii=False) + "\n")
 
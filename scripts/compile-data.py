@@ -0,0 +1,48 @@
+import logging
+from pathlib import Path
+
+import click
+
+from data.compiled import compile_bible, get_compiled_bible_path, hash_bible_sources
+from data.definitions import Bible
+from data.lazy import write_bible_manifest
+from data.lexical import build_bible_lexical_index, get_lexical_index_path, save_lexical_index
+from data.loaders import load_bible_from_dir
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument("bible_version_dirs", nargs=-1, type=click.Path(exists=True, file_okay=False, path_type=Path))
+def main(
+    bible_version_dirs: tuple[Path, ...]
+):
+    """
+    Compile Bible versions into the binary artifacts, lexical indexes and manifests loaded by the MCP server.
+    Defaults to the versions listed in the config.
+    """
+    if not bible_version_dirs:
+        from config import config
+        bible_version_dirs = tuple(Path(d) for d in config["data"]["bible_versions"])
+
+    for bible_ver_path in bible_version_dirs:
+        logger.info("Loading a Bible version from %s", bible_ver_path)
+        bible_ver = load_bible_from_dir(bible_ver_path)
+        assert isinstance(bible_ver, Bible)
+
+        sources_hash = hash_bible_sources(bible_ver_path)
+        compiled_path = get_compiled_bible_path(bible_ver_path)
+        compile_bible(bible_ver, compiled_path, sources_hash=sources_hash)
+        logger.info("-- Compiled %s to %s", bible_ver.version, compiled_path)
+
+        lexical_index_path = get_lexical_index_path(bible_ver_path)
+        save_lexical_index(build_bible_lexical_index(bible_ver), lexical_index_path, sources_hash=sources_hash)
+        logger.info("-- Wrote the lexical index of %s to %s", bible_ver.version, lexical_index_path)
+
+        manifest_path = write_bible_manifest(bible_ver_path)
+        logger.info("-- Wrote the manifest of %s to %s", bible_ver.version, manifest_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import Iterator
+
+import click
+from tqdm import tqdm
+
+from config import config
+from data.definitions import BIBLE_BOOKS, TextChunk
+from data.loaders import _get_bible_version_from_path, load_bible_book_from_file
+from data.splitters import iter_bible_book_chunks
+from db.vector_store import (
+    add_text_chunks, create_collection_if_not_exists, delete_text_chunks_from_other_builds, flush_text_chunks)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.ERROR)
+logging.getLogger("vector_store").setLevel(logging.ERROR)
+
+# Marks the end of the chunk stream
+_END_OF_CHUNKS = object()
+
+
+def _put_unless_stopped(chunk_queue: queue.Queue, item, stop_event: threading.Event) -> bool:
+    """
+    Put item on chunk_queue, waiting while it is full. Returns False if stop_event
+    was set (the publishing stage stopped) before the item could be queued.
+    """
+    while not stop_event.is_set():
+        try:
+            chunk_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _split_bible_versions(
+    bible_ver_dirs: list[str],
+    data_build: str,
+    chunk_queue: queue.Queue,
+    stop_event: threading.Event,
+    audit_file: Path | None
+) -> None:
+    """
+    The loading and splitting stage: load the books one at a time, in the order of their
+    numbered YAML files, and put their chunks on chunk_queue, blocking while the queue is full.
+    Each book is parsed once, so the first chunks are queued as soon as the first book is split.
+    Ends the stream with _END_OF_CHUNKS, or with the exception that stopped the stage.
+    """
+    try:
+        audit_f = audit_file.open("w", encoding="utf-8") if audit_file is not None else None
+        try:
+            i_chunk = 0
+            for bible_ver_dir in bible_ver_dirs:
+                bible_ver_path = Path(bible_ver_dir)
+                assert bible_ver_path.is_dir()
+                version = _get_bible_version_from_path(bible_ver_path)
+                for book_path in sorted(bible_ver_path.glob("*.yaml")):
+                    bible_book = load_bible_book_from_file(book_path)
+                    if bible_book.book not in BIBLE_BOOKS:
+                        continue
+                    logger.info("-- Processing the book of %s (%s)", bible_book.book, version)
+                    for b_chunk in iter_bible_book_chunks(bible_book):
+                        b_chunk.metadata["version"] = version
+                        b_chunk.metadata["data_build"] = data_build
+                        b_chunk.metadata["data_build_id"] = f"{data_build}-{i_chunk}"
+                        i_chunk += 1
+                        if audit_f is not None:
+                            audit_f.write(json.dumps(b_chunk.model_dump(), ensure_ascii=False) + "\n")
+                        if not _put_unless_stopped(chunk_queue, b_chunk, stop_event):
+                            return
+        finally:
+            if audit_f is not None:
+                audit_f.close()
+        _put_unless_stopped(chunk_queue, _END_OF_CHUNKS, stop_event)
+    except Exception as e:
+        logger.error("The splitting stage failed: %s", e, exc_info=True)
+        _put_unless_stopped(chunk_queue, e, stop_event)
+
+
+def _iter_chunk_batches(chunk_queue: queue.Queue, batch_size: int) -> Iterator[list[TextChunk]]:
+    batch = []
+    while True:
+        item = chunk_queue.get()
+        if item is _END_OF_CHUNKS:
+            break
+        if isinstance(item, Exception):
+            raise item
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@click.command()
+@click.option("--create-collection", is_flag=True, help="Create the collection if it does not exist.")
+@click.option("--batch-size", default=config["embedding"]["openai_batch_size"], show_default=True,
+              help="Number of chunks embedded and upserted per batch.")
+@click.option("--max-in-flight", default=4, show_default=True,
+              help="Maximum number of batches being embedded and upserted concurrently.")
+@click.option("--max-queued-batches", default=2, show_default=True,
+              help="Maximum number of batches of split chunks waiting to be published.")
+@click.option("--audit-file", type=click.Path(path_type=Path), default=None,
+              help="Also write the chunks to this JSONL file, in the format of build-data.py.")
+@click.option("--gc", is_flag=True,
+              help="Delete the points of other data builds (and the legacy points without one), in the categories and versions published, after publishing.")
+def main(
+    create_collection: bool,
+    batch_size: int,
+    max_in_flight: int,
+    max_queued_batches: int,
+    audit_file: Path | None,
+    gc: bool
+):
+    """
+    Build and publish the data in one pass: books are loaded, split, embedded and upserted
+    as stages connected by bounded queues, so memory stays flat as the corpus grows.
+    """
+    assert batch_size > 0 and max_in_flight > 0 and max_queued_batches > 0
+
+    # Create the missed collection
+    if create_collection:
+        create_collection_if_not_exists()
+
+    if audit_file is not None:
+        audit_file.parent.mkdir(parents=True, exist_ok=True)
+    data_build = datetime.now().strftime("%Y%m%d%H%M%S")
+    chunk_queue = queue.Queue(maxsize=batch_size * max_queued_batches)
+    stop_event = threading.Event()
+    split_thread = threading.Thread(
+        target=_split_bible_versions,
+        args=(config["data"]["bible_versions"], data_build, chunk_queue, stop_event, audit_file),
+        name="split", daemon=True)
+
+    start_time = time.perf_counter()
+    n_added = 0
+    n_skipped = 0
+    scopes: set[tuple[str, str | None]] = set()
+    split_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor, \
+                tqdm(desc="Publishing data", unit="chunk") as progress:
+            in_flight: set[Future] = set()
+
+            def _collect(done: set[Future]) -> None:
+                nonlocal n_added, n_skipped
+                for future in done:
+                    in_flight.remove(future)
+                    batch_added, batch_skipped = future.result()
+                    n_added += batch_added
+                    n_skipped += batch_skipped
+                    progress.update(batch_added + batch_skipped)
+                progress.set_postfix(chunks_per_sec=f"{(n_added + n_skipped) / (time.perf_counter() - start_time):.1f}")
+
+            for batch in _iter_chunk_batches(chunk_queue, batch_size):
+                # Bound the number of batches in flight; the splitting stage blocks on the full queue meanwhile
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    _collect(done)
+                scopes.update((tc.metadata["category"], tc.metadata.get("version")) for tc in batch)
+                in_flight.add(executor.submit(add_text_chunks, batch))
+            _collect(wait(in_flight).done)
+    finally:
+        stop_event.set()
+        split_thread.join()
+        # Keep what was published, even if a stage failed
+        flush_text_chunks()
+
+    elapsed = time.perf_counter() - start_time
+    chunks_per_sec = (n_added + n_skipped) / elapsed if elapsed > 0 else 0.0
+    click.echo(f"Published {n_added} new and {n_skipped} unchanged chunks of data build {data_build} "
+               f"in {elapsed:.1f}s ({chunks_per_sec:.1f} chunks/sec)")
+
+    if gc:
+        # Only the categories and versions published are replaced by this data build
+        for category, version in sorted(scopes, key=str):
+            delete_text_chunks_from_other_builds(data_build, category, version)
+            click.echo(f"Deleted the points of {category} ({version}) from data builds other than {data_build}")
+        flush_text_chunks()
+
+
+if __name__ == "__main__":
+    main()
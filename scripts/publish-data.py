@@ -1,38 +1,173 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import json
 import logging
 from pathlib import Path
+import time
+from typing import Iterable, Iterator
 
 import click
 from tqdm import tqdm
 
+from config import config
 from data.definitions import TextChunk
-from db.vector_store import add_text_chunk, create_collection_if_not_exists
+from db.vector_store import (
+    add_text_chunks, create_collection_if_not_exists, delete_text_chunks_from_other_builds, flush_text_chunks)
 
 DEFAULT_DATA_FILE = Path(__file__).parents[1] / "build" / "data.jsonl"
+# Minimum time between two checkpoints, each of which persists the pending writes of the local store
+CHECKPOINT_INTERVAL_SECONDS = 30.0
 
 logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.ERROR)
 logging.getLogger("vector_store").setLevel(logging.ERROR)
 
 
+def _batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_text_chunks(data_file: Path, n_skipped_lines: int = 0) -> Iterator[TextChunk]:
+    with data_file.open("r", encoding="utf-8") as f:
+        for i_line, line in enumerate(f):
+            if i_line >= n_skipped_lines:
+                yield TextChunk(**json.loads(line))
+
+
+def _read_data_build(data_file: Path) -> str | None:
+    with data_file.open("r", encoding="utf-8") as f:
+        first_line = f.readline()
+    return json.loads(first_line)["metadata"].get("data_build") if first_line else None
+
+
+def _read_scopes(data_file: Path) -> set[tuple[str, str | None]]:
+    """
+    Return the (category, version) pairs of the chunks of data_file.
+    """
+    scopes = set()
+    with data_file.open("r", encoding="utf-8") as f:
+        for line in f:
+            metadata = json.loads(line)["metadata"]
+            scopes.add((metadata["category"], metadata.get("version")))
+    return scopes
+
+
+def _get_checkpoint_path(data_file: Path) -> Path:
+    return data_file.with_name(data_file.name + ".checkpoint")
+
+
+def _load_checkpoint(data_file: Path, data_build: str | None) -> int:
+    """
+    Return the number of leading lines of data_file already published by this data build.
+    """
+    checkpoint_path = _get_checkpoint_path(data_file)
+    if not checkpoint_path.is_file():
+        return 0
+    with checkpoint_path.open("r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("data_build") != data_build:
+        logger.warning("Ignoring the checkpoint %s of another data build", checkpoint_path)
+        return 0
+    return checkpoint["n_lines"]
+
+
+def _save_checkpoint(data_file: Path, data_build: str | None, n_lines: int) -> None:
+    checkpoint_path = _get_checkpoint_path(data_file)
+    tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"data_build": data_build, "n_lines": n_lines}, f)
+    tmp_path.replace(checkpoint_path)
+
+
 @click.command()
 @click.option("--create-collection", is_flag=True, help="Create the collection if it does not exist.")
-@click.argument("data_file", default=DEFAULT_DATA_FILE, type=click.Path())
+@click.option("--batch-size", default=config["embedding"]["openai_batch_size"], show_default=True,
+              help="Number of chunks embedded and upserted per batch.")
+@click.option("--max-in-flight", default=4, show_default=True,
+              help="Maximum number of batches being embedded and upserted concurrently.")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint of an interrupted publish.")
+@click.option("--gc", is_flag=True,
+              help="Delete the points of other data builds (and the legacy points without one), in the categories and versions published, after publishing.")
+@click.argument("data_file", default=DEFAULT_DATA_FILE, type=click.Path(path_type=Path))
 def main(
     create_collection: bool,
+    batch_size: int,
+    max_in_flight: int,
+    restart: bool,
+    gc: bool,
     data_file: Path
 ):
+    assert batch_size > 0 and max_in_flight > 0
+
     # Create the missed collection
     if create_collection:
         create_collection_if_not_exists()
 
     total_lines = sum(1 for _ in open(data_file, "rb"))
+    data_build = _read_data_build(data_file)
+    n_done_lines = 0 if restart else _load_checkpoint(data_file, data_build)
+    if n_done_lines > 0:
+        click.echo(f"Resuming from line {n_done_lines} of {data_file}")
 
-    with data_file.open("r", encoding="utf-8") as f:
-        for line in tqdm(f, total=total_lines, desc="Publishing data"):
-            data = json.loads(line)
-            b_chunk = TextChunk(**data)
-            add_text_chunk(b_chunk)
+    start_time = time.perf_counter()
+    n_added = 0
+    n_skipped = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor, \
+            tqdm(total=total_lines, initial=n_done_lines, desc="Publishing data", unit="chunk") as progress:
+        in_flight: dict[Future, int] = {}
+        # Batches can finish out of order; the checkpoint only advances over a contiguous prefix
+        batch_sizes: dict[int, int] = {}
+        finished_batches: set[int] = set()
+        i_next_checkpoint_batch = 0
+        last_checkpoint_time = start_time
+
+        def _collect(done: set[Future], final: bool = False) -> None:
+            nonlocal n_added, n_skipped, n_done_lines, i_next_checkpoint_batch, last_checkpoint_time
+            for future in done:
+                batch_added, batch_skipped = future.result()
+                n_added += batch_added
+                n_skipped += batch_skipped
+                progress.update(batch_added + batch_skipped)
+                finished_batches.add(in_flight.pop(future))
+            while i_next_checkpoint_batch in finished_batches:
+                finished_batches.remove(i_next_checkpoint_batch)
+                n_done_lines += batch_sizes.pop(i_next_checkpoint_batch)
+                i_next_checkpoint_batch += 1
+            if final or time.perf_counter() - last_checkpoint_time >= CHECKPOINT_INTERVAL_SECONDS:
+                # The checkpoint must not get ahead of the persisted chunks
+                flush_text_chunks()
+                _save_checkpoint(data_file, data_build, n_done_lines)
+                last_checkpoint_time = time.perf_counter()
+            progress.set_postfix(chunks_per_sec=f"{(n_added + n_skipped) / (time.perf_counter() - start_time):.1f}")
+
+        batches = _batched(_read_text_chunks(data_file, n_skipped_lines=n_done_lines), batch_size)
+        for i_batch, batch in enumerate(batches):
+            # Bound the number of batches in flight (and so the memory held by pending batches)
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                _collect(done)
+            batch_sizes[i_batch] = len(batch)
+            in_flight[executor.submit(add_text_chunks, batch)] = i_batch
+        _collect(wait(in_flight).done, final=True)
+
+    elapsed = time.perf_counter() - start_time
+    chunks_per_sec = (n_added + n_skipped) / elapsed if elapsed > 0 else 0.0
+    click.echo(f"Published {n_added} new and {n_skipped} unchanged chunks in {elapsed:.1f}s ({chunks_per_sec:.1f} chunks/sec)")
+    _get_checkpoint_path(data_file).unlink(missing_ok=True)
+
+    if gc:
+        assert data_build is not None, f"{data_file} has no data_build; rebuild it with build-data.py"
+        # Only the categories and versions of data_file are replaced by this data build
+        for category, version in sorted(_read_scopes(data_file), key=str):
+            delete_text_chunks_from_other_builds(data_build, category, version)
+            click.echo(f"Deleted the points of {category} ({version}) from data builds other than {data_build}")
+        flush_text_chunks()
 
 
 if __name__ == "__main__":
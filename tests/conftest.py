@@ -0,0 +1,46 @@
+import json
+import os
+from pathlib import Path
+import sys
+
+import pytest
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The modules under py/ are imported as top-level packages (e.g. "data"), as in the scripts
+sys.path.insert(0, str(REPO_ROOT / "py"))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def offline_config(tmp_path_factory) -> dict:
+    """
+    Point config.py at an offline copy of config.yaml, as the benchmarks do: stub embedding
+    and chat providers, a local vector store, lazily loaded books and no lexical index.
+    Modules importing config must be imported inside the tests.
+    """
+    work_dir = tmp_path_factory.mktemp("bsb")
+    with open(REPO_ROOT / "config.yaml", "r", encoding="utf-8") as f:
+        test_config = yaml.safe_load(f)
+    test_config["data"]["bible_versions"] = [
+        str(REPO_ROOT / bible_ver_dir) for bible_ver_dir in test_config["data"]["bible_versions"]]
+    test_config["data"]["lazy"] = {"enabled": True, "max_books": 8}
+    test_config["embedding"].update(
+        provider="fake", fake_size=64,
+        cache={"max_entries": 64, "sqlite_path": None})
+    test_config["llm"].update(
+        provider="fake",
+        fake_responses=[json.dumps({"ranked": []})])
+    test_config["search"] = {"lexical_index": False}
+    test_config["vector_store"].update(
+        provider="local",
+        local={"directory": str(work_dir / "vector_store"), "index": "brute"})
+    test_config["metrics"] = {"slow_threshold_seconds": None, "ui_port": None}
+
+    config_path = work_dir / "config.yaml"
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(test_config, f, allow_unicode=True)
+    os.environ["BSB_CONFIG_PATH"] = str(config_path)
+    # The agent-side MCP client is created on import but never connected in the tests
+    os.environ.setdefault("BSB_MCP_SERVER", "http://localhost:8080/mcp")
+    return test_config
@@ -0,0 +1,32 @@
+from pathlib import Path
+import shutil
+
+from data.lazy import LazyBibleIndex, write_bible_manifest
+
+CUVS_PATH = Path(__file__).resolve().parent.parent / "data" / "bible_versions" / "cuvs"
+
+
+def test_stale_manifest_is_rebuilt(tmp_path):
+    bible_version_path = tmp_path / "cuvs"
+    bible_version_path.mkdir()
+    shutil.copy(CUVS_PATH / "008ruth.yaml", bible_version_path)
+    write_bible_manifest(bible_version_path)
+
+    # Edit the YAML files after the manifest was written: rename Ruth and add Jude
+    (bible_version_path / "008ruth.yaml").rename(bible_version_path / "ruth.yaml")
+    shutil.copy(CUVS_PATH / "126jude.yaml", bible_version_path)
+
+    bible_index = LazyBibleIndex(bible_version_path)
+    assert bible_index.book_names == ["ruth", "jude"]
+    assert [v.verse for v in bible_index.get_verses("ruth", 4, 21, 4, 22)] == [21, 22]
+    assert len(bible_index.get_verses("jude", 1, 1, 1, 3)) == 3
+
+
+def test_current_manifest_is_read(tmp_path):
+    bible_version_path = tmp_path / "cuvs"
+    bible_version_path.mkdir()
+    shutil.copy(CUVS_PATH / "008ruth.yaml", bible_version_path)
+    write_bible_manifest(bible_version_path)
+
+    bible_index = LazyBibleIndex(bible_version_path)
+    assert bible_index.manifest["books"]["ruth"]["chapters"] == {1: 22, 2: 23, 3: 18, 4: 22}
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def mcp_server(monkeypatch):
+    """
+    The MCP server with the lexical index disabled (see offline_config), and stub
+    vector search and reranking.
+    """
+    import mcp_server
+
+    assert mcp_server.lexical_indexes == []
+    chunks = [{"text": "神爱世人，甚至将他的独生子赐给他们。", "category": "bible"}]
+    monkeypatch.setattr(mcp_server, "search_text_chunks", lambda query, filters, top_k: chunks)
+    monkeypatch.setattr(
+        mcp_server, "rerank_docs",
+        lambda query, docs: {"ranked": [{"index": i, "score": 5.0} for i in range(len(docs))]})
+    return mcp_server
+
+
+def test_hybrid_search_is_vector_only_without_lexical_index(mcp_server):
+    result = asyncio.run(mcp_server.search_bible_chunks("神爱世人"))
+    assert [chunk["text"] for chunk in result["bible_chunks"]] == ["神爱世人，甚至将他的独生子赐给他们。"]
+
+
+def test_lexical_search_fails_without_lexical_index(mcp_server):
+    result = asyncio.run(mcp_server.search_bible_chunks("神爱世人", mode="lexical"))
+    assert "error" in result
@@ -0,0 +1,54 @@
+import pytest
+
+from data.references import parse_references
+
+
+def _spans(text: str) -> list[tuple]:
+    return [
+        (r.book, r.from_chapter, r.from_verse, r.to_chapter, r.to_verse)
+        for r in parse_references(text)]
+
+
+@pytest.mark.parametrize("text", [
+    "請總結這本書第3章",
+    "接下来3章我们读什么",
+    "Mark 3 points",
+    "将来11:1",
+    "我们大约3:30出发",
+])
+def test_ordinary_words_are_not_references(text):
+    assert parse_references(text) == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("约3:16", [("john", 3, 16, 3, 16)]),
+    ("罗马书 8:28-39", [("romans", 8, 28, 8, 39)]),
+    ("诗篇23篇", [("psalms", 23, None, 23, None)]),
+    ("1 John 1:9", [("1john", 1, 9, 1, 9)]),
+    ("Mark 3:1", [("mark", 3, 1, 3, 1)]),
+    ("出3:14", [("exodus", 3, 14, 3, 14)]),
+    ("诗23篇", [("psalms", 23, None, 23, None)]),
+    ("书3章", [("joshua", 3, None, 3, None)]),
+])
+def test_references(text, expected):
+    assert _spans(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("请解释约3:16的意思", [("john", 3, 16, 3, 16)]),
+    ("读罗8:28", [("romans", 8, 28, 8, 28)]),
+    ("我想读诗篇23篇", [("psalms", 23, None, 23, None)]),
+    ("解释林前13:4-7", [("1corinthians", 13, 4, 13, 7)]),
+    ("請解釋約3:16和來11:1", [("john", 3, 16, 3, 16), ("hebrews", 11, 1, 11, 1)]),
+])
+def test_references_in_sentences(text, expected):
+    assert _spans(text) == expected
+
+
+def test_verse_lists():
+    assert _spans("罗8:28,29") == [
+        ("romans", 8, 28, 8, 28),
+        ("romans", 8, 29, 8, 29)]
+    assert _spans("约3:16、18-20") == [
+        ("john", 3, 16, 3, 16),
+        ("john", 3, 18, 3, 20)]
@@ -0,0 +1,21 @@
+def test_gc_deletes_legacy_points_of_the_scope():
+    from db import vector_store
+
+    local_store = vector_store.local_store
+    assert local_store is not None
+    points = {
+        # Published before the data builds: a random ID, no data_build and no version
+        "legacy": {"text": "legacy", "category": "gc-test", "data_build_id": "20240101000000-0"},
+        "current": {"text": "current", "category": "gc-test", "version": "cuvs", "data_build": "new"},
+        "old": {"text": "old", "category": "gc-test", "version": "cuvs", "data_build": "old"},
+        "other-version": {"text": "other version", "category": "gc-test", "version": "kjv", "data_build": "old"},
+        "other-category": {"text": "other category", "category": "gc-other", "data_build": "old"},
+    }
+    local_store.upsert(
+        list(points.keys()),
+        [[1.0] * local_store.dimension for _ in points],
+        list(points.values()))
+
+    vector_store.delete_text_chunks_from_other_builds("new", category="gc-test", version="cuvs")
+
+    assert set(local_store.retrieve(list(points.keys()))) == {"current", "other-version", "other-category"}
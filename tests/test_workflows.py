@@ -0,0 +1,41 @@
+import inspect
+
+import pytest
+
+COMMANDMENT_QUESTION = "遵守神的命令会带来真正的喜乐吗？为什么？"
+# 1 John 3:23-24
+COMMANDMENT_CHUNK = (
+    "神的命令就是叫我们信他儿子耶稣基督的名、且照他所赐给我们的命令彼此相爱。 "
+    "遵守神命令的、就住在神里面，神也住在他里面。我们所以知道神住在我们里面、是因他所赐给我们的圣灵。")
+# Matthew 18:21-22
+FORGIVENESS_CHUNK = (
+    "那时彼得进前来、对耶稣说、主阿、我弟兄得罪我、我当饶恕他几次呢．到七次可以么。 "
+    "耶稣说、我对你说、不是到七次、乃是到七十个七次。")
+
+
+@pytest.fixture
+def min_score() -> float:
+    import mcp_server
+    return inspect.signature(mcp_server.search_bible_chunks).parameters["min_score"].default
+
+
+@pytest.mark.parametrize("query", [
+    COMMANDMENT_QUESTION,
+    "遵守神的命令會帶來真正的喜樂嗎？為什麼？",
+])
+def test_local_rerank_keeps_relevant_chunks(query, min_score):
+    from workflows import rank_docs_locally
+
+    ranked = rank_docs_locally(query, [FORGIVENESS_CHUNK, COMMANDMENT_CHUNK])["ranked"]
+    scores = {rd["index"]: rd["score"] for rd in ranked}
+    assert ranked[0]["index"] == 1
+    assert scores[1] >= min_score
+    assert scores[0] < min_score
+
+
+def test_local_rerank_scores_are_absolute():
+    from workflows import rank_docs_locally
+
+    alone = rank_docs_locally(COMMANDMENT_QUESTION, [COMMANDMENT_CHUNK])["ranked"]
+    with_other = rank_docs_locally(COMMANDMENT_QUESTION, [COMMANDMENT_CHUNK, FORGIVENESS_CHUNK])["ranked"]
+    assert alone[0]["score"] == next(rd["score"] for rd in with_other if rd["index"] == 0)